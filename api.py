@@ -1,58 +1,309 @@
 import asyncio
+import functools
+import json
+import queue
+import random
 import re
+import threading
+import time
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import logging
-import nest_asyncio
+import generation_cache
+from model_backend import create_model, model_name
+import metrics
+from platforms import (DRAFT_COUNT, generation_config, combined_max_output_tokens, draft_text, draft_problems,
+                       validate_drafts, repair_prompt)
+from config import (GEMINI_MODEL_NAME, GEMINI_MAX_CONCURRENCY, GEMINI_TIMEOUT_SECONDS, GEMINI_MAX_RETRIES,
+                    GEMINI_BACKOFF_BASE_SECONDS, GEMINI_BACKOFF_MAX_SECONDS, GEMINI_GENERATION_CONFIG,
+                    GEMINI_COMBINED_GENERATION, COMBINED_PROMPT_TEMPLATE, GEMINI_HEDGE_ENABLED,
+                    GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES, GEMINI_HEDGE_DEFAULT_SECONDS,
+                    GEMINI_HEDGE_MIN_SECONDS, GEMINI_HEDGE_BUDGET, GEMINI_FALLBACK_MODEL_NAME,
+                    GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN_SECONDS, GEMINI_REPAIR_ROUNDS)
 
 logger = logging.getLogger(__name__)
 
-# Apply nest_asyncio for Streamlit compatibility
-nest_asyncio.apply()
-
-# Configure Gemini API
-API_KEY = None
-try:
-    load_dotenv()
-    API_KEY = os.getenv("GEMINI_API_KEY")
-    if not API_KEY:
-        raise ValueError("GEMINI_API_KEY environment variable is not set")
-    genai.configure(api_key=API_KEY)
-    logger.info("Gemini API configured successfully")
-except Exception as e:
-    logger.error(f"API Key configuration error: {e}")
-    st.error(f"API Key configuration error: {e}")
-    raise
-
-# Initialize model
-try:
-    model = genai.GenerativeModel("gemini-2.5-flash-lite")
-    logger.info("Gemini model initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Gemini model: {e}")
-    st.error(f"Failed to initialize Gemini model: {e}")
-    raise
-
-async def generate_single_prompt(prompt: str) -> str:
-    logger.info("Generating content with Gemini API")
+# Configure the model backend (Gemini, or the offline fake when MODEL_BACKEND=fake)
+load_dotenv()
+API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_NAME = model_name()
+
+@functools.cache
+def retryable_errors() -> tuple:
+    """
+    429 and 5xx responses, plus our own per-attempt deadline. Resolved on first use
+    (an except clause only evaluates it once something was raised) to keep google.api_core off the import path.
+    """
+    from google.api_core import exceptions as google_exceptions
+    return (
+        asyncio.TimeoutError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.DeadlineExceeded,
+    )
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphores = {}
+_models = {}
+_model_lock = threading.Lock()
+_breakers = {}
+_hedge_counts = {"requests": 0, "hedges": 0}
+
+class CircuitOpenError(Exception):
+    """Every configured model's circuit is open: fail fast instead of calling the API."""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one model. Once open, requests are refused until the
+    cooldown has passed; then a single probe goes through and its outcome closes or reopens it.
+    Only used on the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, name: str, threshold: int = GEMINI_BREAKER_FAILURES, cooldown: float = GEMINI_BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # The request ended without saying anything about the model's health (cancelled, bad request)
+        self.probing = False
+
+def _breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+def get_model(name: str = None):
+    """
+    Return the process-wide client for a model (GEMINI_MODEL_NAME by default), created on first
+    use so the Gemini SDK is not imported until a generation actually needs it. A failed creation is retried on the next call.
+    """
+    name = name or GEMINI_MODEL_NAME
+    model = _models.get(name)
+    if model is None:
+        with _model_lock:
+            model = _models.get(name)
+            if model is None:
+                try:
+                    model = _models[name] = create_model(API_KEY, name)
+                    logger.info(f"Model {model_name(name)} initialized successfully")
+                except Exception as e:
+                    logger.error(f"Failed to initialize model {model_name(name)}: {e}")
+                    raise
+    return model
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop used for all Gemini calls.
+    It runs on a daemon thread so every Streamlit session shares one loop and one concurrency limit.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gemini-event-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop from synchronous code and wait for the result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+def _request_slot() -> asyncio.Semaphore:
+    # Only ever called on the event loop thread, so no lock is needed
+    semaphore = _semaphores.get(API_KEY)
+    if semaphore is None:
+        semaphore = _semaphores[API_KEY] = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return semaphore
+
+def _backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def _prompt_cache_key(prompt: str, generation_config: dict = None) -> str:
+    return generation_cache.cache_key(prompt, MODEL_NAME, {**GEMINI_GENERATION_CONFIG, **(generation_config or {})})
+
+def _pick_model() -> str:
+    """The primary model, or the fallback while the primary's circuit is open."""
+    for name in (GEMINI_MODEL_NAME, GEMINI_FALLBACK_MODEL_NAME):
+        if name and _breaker(name).allow():
+            return name
+    raise CircuitOpenError("circuit open for every configured model")
+
+def _latency_metric(name: str, generation_config: dict = None) -> str:
+    # JSON-mode (combined) requests write several platforms' drafts, so they get their own stats
+    json_mode = (generation_config or {}).get("response_mime_type") == "application/json"
+    return f"gemini.model.{name}{'.json' if json_mode else ''}"
+
+def _hedge_delay(name: str, generation_config: dict = None) -> float:
+    """Seconds to wait before hedging: the model's recent latency percentile, once there are enough samples."""
+    observed = metrics.percentile(_latency_metric(name, generation_config), GEMINI_HEDGE_PERCENTILE, GEMINI_HEDGE_MIN_SAMPLES)
+    return max(GEMINI_HEDGE_MIN_SECONDS, GEMINI_HEDGE_DEFAULT_SECONDS if observed is None else observed)
+
+def _hedge_budget_left() -> bool:
+    # Hedges are capped at a fraction of requests, so a slowdown can't turn into double the load
+    return _hedge_counts["hedges"] < GEMINI_HEDGE_BUDGET * _hedge_counts["requests"]
+
+async def _attempt(name: str, prompt: str, generation_config: dict = None) -> str:
+    """One request to one model. Feeds its circuit breaker and latency stats."""
+    breaker = _breaker(name)
+    metric = _latency_metric(name, generation_config)
+    start = None
     try:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, lambda: model.generate_content(prompt))
-        logger.debug("Content generated successfully")
-        return response.text
-    except Exception as e:
-        logger.error(f"Error generating content from Gemini API: {e}")
-        st.error(f"Error generating content from Gemini API: {e}")
-        return ""
+        # The deadline includes waiting for a request slot, so queueing under load can't stretch it
+        async with asyncio.timeout(GEMINI_TIMEOUT_SECONDS):
+            async with _request_slot():
+                with metrics.timer("gemini.request"):
+                    start = time.perf_counter()
+                    response = await get_model(name).generate_content_async(
+                        prompt,
+                        generation_config=generation_config,
+                        request_options={"timeout": GEMINI_TIMEOUT_SECONDS}
+                    )
+                    text = response.text
+    except retryable_errors() as e:
+        if start is None:
+            # Timed out waiting for a slot; the model never saw the request
+            breaker.release()
+            raise
+        breaker.record_failure()
+        if isinstance(e, asyncio.TimeoutError):
+            metrics.observe(metric, time.perf_counter() - start)
+        raise
+    except asyncio.CancelledError:
+        breaker.release()
+        if start is not None:
+            # A hedge loser took at least this long. Leaving slow requests out would drag the
+            # percentile, and with it the hedge delay, down until nearly every request is hedged.
+            metrics.observe(metric, time.perf_counter() - start)
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    metrics.observe(metric, time.perf_counter() - start)
+    breaker.record_success()
+    return text
+
+async def _request(prompt: str, generation_config: dict = None) -> tuple[str, str]:
+    """
+    Send prompt to the first model whose circuit is closed. With hedging enabled, a duplicate goes out
+    (to the fallback model when set) if no answer arrived within the hedge delay; the first non-empty
+    answer wins and the other request is cancelled. Returns (text, model name).
+    """
+    primary = _pick_model()
+    _hedge_counts["requests"] += 1
+    first = asyncio.ensure_future(_attempt(primary, prompt, generation_config))
+    tasks = {first: primary}
+    try:
+        if GEMINI_HEDGE_ENABLED:
+            done, _ = await asyncio.wait({first}, timeout=_hedge_delay(primary, generation_config))
+            # Check the budget before allow(): a breaker past its cooldown lets exactly one probe through,
+            # so asking it and then not sending the hedge would leave it waiting on a probe forever
+            if not done and _hedge_budget_left():
+                hedge = next((n for n in (GEMINI_FALLBACK_MODEL_NAME, primary) if n and _breaker(n).allow()), None)
+                if hedge:
+                    _hedge_counts["hedges"] += 1
+                    logger.info(f"No answer from {primary} yet; hedging with {hedge}")
+                    tasks[asyncio.ensure_future(_attempt(hedge, prompt, generation_config))] = hedge
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result():
+                    if task is not first:
+                        logger.info(f"Hedged request to {tasks[task]} answered first")
+                    return task.result(), tasks[task]
+                error = error or task.exception()
+        if error is not None:
+            raise error
+        return "", primary
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+@metrics.timed()
+async def generate_single_prompt(prompt: str, force_fresh: bool = False, generation_config: dict = None,
+                                 cache: bool = True) -> str:
+    """
+    Generate text for one prompt. generation_config overrides the model defaults for this call
+    (and is part of the cache key); cache=False neither reads nor stores the generation cache.
+    Returns "" on failure.
+    """
+    logger.info("Generating content with Gemini API")
+    key = _prompt_cache_key(prompt, generation_config)
+    if cache and not force_fresh:
+        cached = await asyncio.to_thread(generation_cache.get, key)
+        if cached is not None:
+            logger.debug("Content served from generation cache")
+            return cached
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            text, name = await _request(prompt, generation_config)
+            logger.debug(f"Content generated successfully by {name}")
+            if text and cache:
+                await asyncio.to_thread(generation_cache.put, key, model_name(name), text)
+            return text
+        except CircuitOpenError as e:
+            logger.error(f"Not calling Gemini API: {e}")
+            metrics.mark_error()
+            return ""
+        except retryable_errors() as e:
+            if attempt == GEMINI_MAX_RETRIES:
+                logger.error(f"Giving up on Gemini API after {attempt + 1} attempts: {e!r}")
+                metrics.mark_error()
+                return ""
+            delay = _backoff_delay(attempt)
+            logger.warning(f"Retryable Gemini API error ({e!r}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            # Runs on the shared loop thread, outside any Streamlit session: callers surface failures
+            logger.error(f"Error generating content from Gemini API: {e}")
+            metrics.mark_error()
+            return ""
+    return ""
 
 def split_numbered_drafts(text: str) -> list[str]:
     logger.info("Splitting generated drafts")
     try:
         pattern = r"(?:^|\n)(\d[\.\)]\s.*?)(?=\n\d[\.\)]\s|$)"
         matches = re.findall(pattern, text, re.DOTALL)
-        if len(matches) < 3:
+        # Two numbered drafts are kept as such; repair_platform_drafts asks for the missing one
+        if len(matches) < 2:
             parts = re.split(r"\n\d[\.\)]\s", text)
             drafts = [p.strip() for p in parts if p.strip()]
             logger.debug(f"Split into {len(drafts)} drafts (fallback method)")
@@ -64,16 +315,274 @@ def split_numbered_drafts(text: str) -> list[str]:
         st.error(f"Error parsing generated drafts: {e}")
         return [text.strip()]
 
-async def generate_platform_drafts(platform: str, vars: dict, prompt_templates: dict) -> list[str]:
+# Start of a numbered draft ("1. ", "2) ", ...), same convention as split_numbered_drafts
+_DRAFT_HEADER = re.compile(r"(?:^|\n)(?=\d[\.\)]\s)")
+
+def complete_drafts(text: str, final: bool = False) -> list[str]:
+    """
+    Drafts in a (possibly partial) numbered response that are already finished: each one
+    ends where the next numbered header starts. With final=True the last draft counts too.
+    """
+    starts = [m.end() for m in _DRAFT_HEADER.finditer(text)]
+    if not starts:
+        return [text.strip()] if final and text.strip() else []
+    bounds = starts + [len(text)]
+    drafts = [text[a:b].strip() for a, b in zip(bounds, bounds[1:])]
+    if not final:
+        drafts = drafts[:-1]
+    return [d for d in drafts if d]
+
+@metrics.timed()
+async def stream_platform_drafts(platform: str, vars: dict, prompt_templates: dict, on_draft, force_fresh: bool = False) -> list[str]:
+    """
+    Generate drafts for one platform with a streaming request, calling on_draft(index, draft)
+    as soon as each numbered draft is complete. Returns the final drafts (at most 3).
+    """
+    logger.info(f"Streaming drafts for platform: {platform}")
+    prompt = prompt_templates[platform].format(**vars)
+    config = generation_config(platform)
+    key = _prompt_cache_key(prompt, config)
+    text = None if force_fresh else await asyncio.to_thread(generation_cache.get, key)
+    emitted = 0
+    finished = text is not None
+    if text is None:
+        text = ""
+        for attempt in range(GEMINI_MAX_RETRIES + 1):
+            # Streams are not hedged (drafts already shown can't be swapped), but they respect the breakers
+            name = breaker = None
+            sent = False
+            try:
+                name = _pick_model()
+                breaker = _breaker(name)
+                # As in _attempt, the deadline includes waiting for a request slot
+                async with asyncio.timeout(GEMINI_TIMEOUT_SECONDS):
+                    async with _request_slot():
+                        with metrics.timer("gemini.stream_request"):
+                            sent = True
+                            response = await get_model(name).generate_content_async(
+                                prompt, generation_config=config, stream=True,
+                                request_options={"timeout": GEMINI_TIMEOUT_SECONDS}
+                            )
+                            async for chunk in response:
+                                text += chunk.text
+                                for draft in complete_drafts(text)[emitted:DRAFT_COUNT]:
+                                    on_draft(emitted, draft)
+                                    emitted += 1
+                finished = True
+                breaker.record_success()
+                if text:
+                    await asyncio.to_thread(generation_cache.put, key, model_name(name), text)
+                break
+            except retryable_errors() as e:
+                if sent:
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                if emitted or attempt == GEMINI_MAX_RETRIES:
+                    # Drafts already shown can't be taken back; keep what completed
+                    logger.error(f"Streaming from Gemini API for {platform} failed: {e!r}")
+                    metrics.mark_error()
+                    break
+                text = ""
+                delay = _backoff_delay(attempt)
+                logger.warning(f"Retryable Gemini API error ({e!r}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                if breaker is not None:
+                    breaker.release()
+                logger.error(f"Error streaming content from Gemini API for {platform}: {e}")
+                metrics.mark_error()
+                break
+    if finished:
+        drafts = split_numbered_drafts(text)[:DRAFT_COUNT] if text.strip() else []
+    else:
+        # The stream was cut off: its last draft may be truncated, so keep only those already complete
+        drafts = complete_drafts(text)[:DRAFT_COUNT]
+    for i in range(emitted, len(drafts)):
+        on_draft(i, drafts[i])
+    logger.debug(f"Streamed {len(drafts)} drafts for {platform}")
+    return drafts
+
+def iter_streamed_drafts(vars: dict, prompt_templates: dict, force_fresh: bool = False):
+    """
+    Stream drafts for every platform concurrently, for use from synchronous Streamlit code.
+    Yields ("draft", platform, index, text) as each draft completes, then
+    ("done", platform, drafts) once a platform's final drafts are known.
+    """
+    get_model()
+    events = queue.Queue()
+    finished = object()
+
+    async def stream_one(platform):
+        drafts = await stream_platform_drafts(
+            platform, vars, prompt_templates,
+            lambda index, draft: events.put(("draft", platform, index, draft)),
+            force_fresh
+        )
+        # Drafts already shown stay on screen; the final list carries any replacements
+        drafts = await repair_platform_drafts(platform, vars, prompt_templates, drafts, force_fresh)
+        events.put(("done", platform, drafts))
+
+    async def stream_all():
+        try:
+            await asyncio.gather(*(stream_one(p) for p in prompt_templates))
+        finally:
+            events.put(finished)
+
+    future = asyncio.run_coroutine_threadsafe(stream_all(), get_event_loop())
+    while True:
+        event = events.get()
+        if event is finished:
+            break
+        yield event
+    future.result()
+
+async def generate_platform_drafts(platform: str, vars: dict, prompt_templates: dict, force_fresh: bool = False) -> list[str]:
     logger.info(f"Generating drafts for platform: {platform}")
     try:
         template = prompt_templates[platform]
         prompt = template.format(**vars)
-        txt = await generate_single_prompt(prompt)
+        txt = await generate_single_prompt(prompt, force_fresh, generation_config(platform))
+        if not txt:
+            return []
         drafts = split_numbered_drafts(txt)
         logger.debug(f"Generated {len(drafts)} drafts for {platform}")
-        return drafts[:3]
+        return drafts[:DRAFT_COUNT]
     except Exception as e:
         logger.error(f"Error generating drafts for {platform}: {e}")
-        st.error(f"Error generating drafts for {platform}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+@metrics.timed()
+async def repair_platform_drafts(platform: str, vars: dict, prompt_templates: dict, drafts: list[str],
+                                 force_fresh: bool = False) -> list[str]:
+    """
+    Check drafts against the platform's rules and regenerate only the failing or missing ones with a
+    targeted prompt, for up to GEMINI_REPAIR_ROUNDS rounds. A rejected draft whose replacement fails
+    too is kept, since an imperfect draft can still be edited.
+    """
+    if not drafts:
+        # The request itself failed and was already retried; a repair would be a full regeneration
+        return drafts
+    drafts = list(drafts[:DRAFT_COUNT])
+    # Keep the replacements' numbering consistent with the drafts around them
+    numbered = draft_text(drafts[0]) != drafts[0].strip()
+    for _ in range(GEMINI_REPAIR_ROUNDS):
+        problems = validate_drafts(platform, drafts, vars)
+        if not problems:
+            break
+        logger.info(f"Regenerating {len(problems)} {platform} drafts: {problems}")
+        prompt = repair_prompt(prompt_templates[platform].format(**vars), problems)
+        # Uncached: a later round asks the same question, and replaying the answer that just failed can't fix anything
+        txt = await generate_single_prompt(prompt, generation_config=generation_config(platform), cache=False)
+        if not txt:
+            break
+        for index, replacement in zip(sorted(problems), complete_drafts(txt, final=True)):
+            text = draft_text(replacement)
+            replacement = f"{index + 1}. {text}" if numbered else text
+            if index >= len(drafts):
+                drafts.append(replacement)
+            elif not draft_problems(platform, replacement, vars):
+                drafts[index] = replacement
+    return drafts
+
+async def generate_all_platform_drafts(vars: dict, prompt_templates: dict, force_fresh: bool = False) -> dict[str, list[str]]:
+    """Generate drafts for every platform concurrently. Platforms that failed map to []."""
+    results = await asyncio.gather(*(generate_platform_drafts(p, vars, prompt_templates, force_fresh) for p in prompt_templates))
+    return dict(zip(prompt_templates, results))
+
+def _combined_generation_config(platforms) -> dict:
+    return {
+        "max_output_tokens": combined_max_output_tokens(platforms),
+        "response_mime_type": "application/json",
+        "response_schema": {
+            "type": "OBJECT",
+            "properties": {p: {"type": "ARRAY", "items": {"type": "STRING"}} for p in platforms},
+            "required": list(platforms),
+        },
+    }
+
+def parse_combined_drafts(text: str, platforms) -> dict[str, list[str]]:
+    """
+    Parse a combined JSON response into {platform: drafts}.
+    Platforms missing from the response or without any usable draft are left out.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        logger.warning(f"Combined response is not valid JSON: {e}")
+        return {}
+    if not isinstance(data, dict):
+        logger.warning("Combined response is not a JSON object")
+        return {}
+    drafts = {}
+    for platform in platforms:
+        items = data.get(platform)
+        if isinstance(items, list):
+            cleaned = [item.strip() for item in items if isinstance(item, str) and item.strip()]
+            if cleaned:
+                drafts[platform] = cleaned[:DRAFT_COUNT]
+    return drafts
+
+@metrics.timed()
+async def generate_combined_drafts(vars: dict, platforms, force_fresh: bool = False) -> dict[str, list[str]]:
+    """Generate drafts for all platforms in a single JSON-mode request. May return a partial dict."""
+    logger.info(f"Generating combined drafts for platforms: {list(platforms)}")
+    prompt = COMBINED_PROMPT_TEMPLATE.format(**vars)
+    config = _combined_generation_config(platforms)
+    txt = await generate_single_prompt(prompt, force_fresh, config)
+    if not txt:
+        metrics.mark_error()
+        return {}
+    drafts = parse_combined_drafts(txt, platforms)
+    if len(drafts) < len(platforms):
+        # Don't let a malformed answer be replayed from the cache
+        await asyncio.to_thread(generation_cache.delete, _prompt_cache_key(prompt, config))
+    logger.debug(f"Combined request produced drafts for {list(drafts)}")
+    return drafts
+
+@metrics.timed()
+async def generate_all_drafts(vars: dict, prompt_templates: dict, force_fresh: bool = False) -> dict[str, list[str]]:
+    """
+    Generate drafts for every platform: one combined request when enabled, with the
+    per-platform requests as a fallback for any platform it did not cover. Drafts that
+    fail their platform's checks are then regenerated individually.
+    """
+    # Fail fast on a misconfigured backend (e.g. no API key) rather than one empty result per platform
+    get_model()
+    drafts = {}
+    if GEMINI_COMBINED_GENERATION:
+        drafts = await generate_combined_drafts(vars, list(prompt_templates), force_fresh)
+    missing = {p: t for p, t in prompt_templates.items() if p not in drafts}
+    if missing:
+        if drafts:
+            logger.info(f"Falling back to per-platform generation for: {list(missing)}")
+        drafts.update(await generate_all_platform_drafts(vars, missing, force_fresh))
+    repaired = await asyncio.gather(
+        *(repair_platform_drafts(p, vars, prompt_templates, drafts[p], force_fresh) for p in prompt_templates)
+    )
+    return dict(zip(prompt_templates, repaired))
+
+def _needs_repair(platform: str, drafts: list[str], vars: dict) -> bool:
+    # Mirrors repair_platform_drafts: an empty list is left alone, anything else that fails is regenerated
+    return GEMINI_REPAIR_ROUNDS > 0 and bool(drafts) and bool(validate_drafts(platform, drafts, vars))
+
+def all_prompts_cached(vars: dict, prompt_templates: dict, stream: bool = False) -> bool:
+    """
+    True when generating (streamed, or through generate_all_drafts) would be answered entirely from
+    the generation cache, i.e. it makes no API call. Checks the prompts of the path that will run,
+    and cached drafts that would be sent for repair count as a miss.
+    """
+    platforms = list(prompt_templates)
+    if GEMINI_COMBINED_GENERATION and not stream:
+        text = generation_cache.get(
+            _prompt_cache_key(COMBINED_PROMPT_TEMPLATE.format(**vars), _combined_generation_config(platforms)), record=False
+        )
+        if text is None:
+            return False
+        drafts = parse_combined_drafts(text, platforms)
+        return len(drafts) == len(platforms) and not any(_needs_repair(p, drafts[p], vars) for p in platforms)
+    for platform, template in prompt_templates.items():
+        text = generation_cache.get(_prompt_cache_key(template.format(**vars), generation_config(platform)), record=False)
+        if text is None or _needs_repair(platform, split_numbered_drafts(text)[:DRAFT_COUNT], vars):
+            return False
+    return True
@@ -0,0 +1,237 @@
+"""
+Micro-benchmarks for the db.py scheduling, reminder and auth paths on synthetic data.
+
+Builds a database per size (users plus scheduled posts spread from 30 days ago
+to 60 days ahead, weighted towards posting hours), then times each operation at
+several concurrency levels. Results are written as JSON and, when a baseline is
+given, compared against it; the exit status is 1 if any operation regressed.
+
+    python benchmarks/db_bench.py                                   # 10k/100k/1M posts
+    python benchmarks/db_bench.py --sizes 10000 --concurrency 1,4   # quick run
+    python benchmarks/db_bench.py --save-baseline                   # record benchmarks/baseline.json
+    python benchmarks/db_bench.py --baseline benchmarks/baseline.json
+
+Each size runs in a fresh process so db.py's pool and init_db state start clean.
+The read cache is bypassed (.uncached) so SQLite itself is measured.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+PLATFORMS = ("twitter", "linkedin", "instagram")
+REMINDER_CHOICES = (15, 30, 60, 60, 60, 120, 1440)
+# Relative weight of each IST hour of the day; most posts land mid-morning and early evening
+HOUR_WEIGHTS = (1, 1, 1, 1, 1, 1, 2, 4, 6, 8, 8, 6, 5, 5, 4, 4, 5, 7, 8, 7, 5, 3, 2, 1)
+WORDS = ("launch", "product", "team", "growth", "AI", "writing", "tips", "today", "customers", "story",
+         "insight", "update", "feature", "community", "thanks", "learn", "build", "ship", "weekly", "news")
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def generate_database(path: str, users: int, posts: int, seed: int):
+    """Populate a migrated database at path with synthetic users and posts."""
+    import db
+    rng = random.Random(seed)
+    db.init_db()
+    password_hash = db.password_context().hash("benchmark")  # bcrypt once, shared by every user
+    now = datetime.now(IST).replace(second=0, microsecond=0)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (email, password, role, api_calls) VALUES (?, ?, 'user', ?)",
+        ((f"user{i}@example.com", password_hash, rng.randrange(10)) for i in range(users))
+    )
+
+    def rows():
+        for _ in range(posts):
+            # Heavy-tailed: a few users schedule most of the posts
+            owner = int(rng.paretovariate(1.2) * 7) % users
+            day = now.date() + timedelta(days=rng.randint(-30, 60))
+            hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+            when = datetime(day.year, day.month, day.day, hour, rng.randrange(60), tzinfo=IST)
+            reminder_minutes = rng.choice(REMINDER_CHOICES)
+            schedule_at = int(when.timestamp())
+            content = " ".join(rng.choices(WORDS, k=rng.randint(8, 40)))
+            yield (f"user{owner}@example.com", rng.choice(PLATFORMS), content, when.isoformat(),
+                   reminder_minutes, int(when < now), schedule_at, schedule_at - reminder_minutes * 60)
+
+    conn.executemany(
+        "INSERT INTO scheduled_posts (user_email, platform, content, schedule_time, reminder_minutes, reminder_sent, schedule_at, remind_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+def _operations(users: int, posts: int, seed: int):
+    """(name, call count scale, factory) for each benchmarked operation; factories build per-call closures."""
+    import db
+    rng = random.Random(seed + 1)
+    lock = threading.Lock()
+    soon = datetime.now(IST) + timedelta(days=7)
+
+    def user():
+        with lock:
+            return f"user{int(rng.paretovariate(1.2) * 7) % users}@example.com"
+
+    def post_id():
+        with lock:
+            return rng.randint(1, posts)
+
+    def term():
+        with lock:
+            return rng.choice(WORDS)
+
+    return [
+        ("get_user_scheduled_posts", 1.0, lambda: db.get_user_scheduled_posts.uncached(user())),
+        ("get_reminder_posts", 1.0, db.get_reminder_posts),
+        ("get_all_scheduled_posts", 0.02, db.get_all_scheduled_posts.uncached),
+        ("schedule_post", 1.0, lambda: db.schedule_post(user(), "twitter", "benchmark post", soon, 60)),
+        ("verify_user", 0.1, lambda: db.verify_user(user(), "benchmark")),
+        ("mark_reminder_sent", 1.0, lambda: db.mark_reminder_sent(post_id())),
+        # Every synthetic post uses the same 20 words, so these are the common-term worst case
+        ("search_user_posts", 1.0, lambda: db.search_scheduled_posts.uncached(term(), user())),
+        ("search_user_posts_prefix", 1.0, lambda: db.search_scheduled_posts.uncached(term()[:2], user())),
+    ]
+
+def _time_operation(fn, calls: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = [calls]
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            fn()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / wall, 1),
+    }
+
+def run_size(args, posts: int, data_dir: str, results):
+    """Runs in a child process: DB_PATH must be set before db is imported."""
+    path = os.path.join(data_dir, f"bench_{posts}.db")
+    os.environ["DB_PATH"] = path
+    os.environ["METRICS_SAMPLE_RATE"] = "0"
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    generate_database(path, args.users, posts, args.seed)
+    print(f"[{posts} posts] generated in {time.perf_counter() - started:.1f}s", flush=True)
+    for name, scale, fn in _operations(args.users, posts, args.seed):
+        if args.operations and name not in args.operations:
+            continue
+        for concurrency in args.concurrency:
+            calls = max(concurrency, int(args.iterations * scale))
+            result = {"operation": name, "posts": posts, "users": args.users, "concurrency": concurrency,
+                      **_time_operation(fn, calls, concurrency)}
+            print(f"[{posts} posts] {name} x{concurrency}: p50 {result['p50_ms']}ms "
+                  f"p95 {result['p95_ms']}ms {result['ops_per_sec']} ops/s", flush=True)
+            results.append(result)
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Return (key, metric, baseline, current) for every p50/p95 slower than baseline * threshold."""
+    previous = {(r["operation"], r["posts"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["operation"], result["posts"], result["concurrency"])
+        before = previous.get(key)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if result[metric] > before[metric] * threshold:
+                regressions.append((key, metric, before[metric], result[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark db.py against synthetic databases.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated scheduled_posts counts")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--iterations", type=int, default=500, help="calls per operation before per-operation scaling")
+    parser.add_argument("--operations", default="", help="comma-separated subset of operations to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="where to build databases (default: a temporary directory)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="compare with this results file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown ratio before flagging")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write results to {DEFAULT_BASELINE}")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.operations = {o for o in args.operations.split(",") if o}
+
+    manager = multiprocessing.Manager()
+    results = manager.list()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for posts in (int(s) for s in args.sizes.split(",")):
+            child = multiprocessing.get_context("spawn").Process(target=run_size, args=(args, posts, data_dir, results))
+            child.start()
+            child.join()
+            if child.exitcode != 0:
+                sys.exit(f"Benchmark for {posts} posts failed with exit code {child.exitcode}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: sorted(v) if isinstance(v, set) else v for k, v in vars(args).items()},
+        },
+        "results": list(results),
+    }
+    targets = [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for target in targets:
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        with open(target, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {target}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        for (operation, posts, concurrency), metric, before, after in regressions:
+            print(f"REGRESSION {operation} ({posts} posts, x{concurrency}) {metric}: {before}ms -> {after}ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold}x baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold-start import-time report for the app.
+
+Imports main.py in fresh interpreters with `python -X importtime` and reports
+the median total plus a breakdown: the app's own modules and the heaviest
+third-party packages by self time. With --budget-ms it exits 1 if the median
+total is over budget, so CI can hold the cold-start budget.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --runs 5 --budget-ms 1500 --output benchmarks/results/import_time.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = {os.path.splitext(name)[0] for name in os.listdir(ROOT) if name.endswith(".py")}
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_once(target: str) -> list:
+    """Return (module, self_us, cumulative_us, depth) for every import made by `import target`."""
+    env = {**os.environ, "MODEL_BACKEND": os.environ.get("MODEL_BACKEND", "fake"), "LOG_LEVEL": "WARNING"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {target} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+def summarize(rows: list, target: str, top: int) -> dict:
+    total_us = next(cumulative for module, _, cumulative, _ in rows if module == target)
+    app = {module: cumulative for module, _, cumulative, _ in rows if module in APP_MODULES}
+    packages = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        packages[module.split(".")[0]] += self_us
+    third_party = sorted(((p, us) for p, us in packages.items() if p not in APP_MODULES), key=lambda item: -item[1])
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "app_modules_cumulative_ms": {m: round(us / 1000, 1) for m, us in sorted(app.items(), key=lambda item: -item[1])},
+        "top_packages_self_ms": {p: round(us / 1000, 1) for p, us in third_party[:top]},
+        "modules_imported": len(rows),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold-start import time for the app.")
+    parser.add_argument("--target", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to run; the median run is reported")
+    parser.add_argument("--top", type=int, default=15, help="third-party packages to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median total exceeds this")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    # The first run also warms the bytecode cache, so it is not counted
+    measure_once(args.target)
+    runs = [summarize(measure_once(args.target), args.target, args.top) for _ in range(args.runs)]
+    report = sorted(runs, key=lambda run: run["total_ms"])[len(runs) // 2]
+    report["runs_total_ms"] = [run["total_ms"] for run in runs]
+    report["median_total_ms"] = statistics.median(report["runs_total_ms"])
+
+    print(f"import {args.target}: median {report['median_total_ms']}ms over {args.runs} runs "
+          f"({report['modules_imported']} modules)")
+    print("App modules (cumulative):")
+    for module, ms in report["app_modules_cumulative_ms"].items():
+        print(f"  {module:<24}{ms:>10.1f} ms")
+    print("Heaviest packages (self):")
+    for package, ms in report["top_packages_self_ms"].items():
+        print(f"  {package:<24}{ms:>10.1f} ms")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.budget_ms is not None and report["median_total_ms"] > args.budget_ms:
+        sys.exit(f"Cold start over budget: {report['median_total_ms']}ms > {args.budget_ms}ms")
+
+if __name__ == "__main__":
+    main()
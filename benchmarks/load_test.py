@@ -0,0 +1,177 @@
+"""
+End-to-end load test: N simulated users driving the Streamlit app offline.
+
+Each simulated user is its own AppTest session running main.py against the
+fake model backend and a scratch database. Each session logs in as a
+synthetic user, then repeatedly enters a topic, clicks "Generate All Drafts"
+and schedules a draft. All sessions run in one process, so they share the
+Gemini event loop, connection pool and caches as a real server would.
+
+The report (JSON, plus a printed summary) covers:
+- rerun latency per action
+- generation latency
+- the instrumented DB timings from metrics.py, whose write-path p95 and error
+  counts show lock contention
+
+    python benchmarks/load_test.py --users 20 --iterations 5
+    FAKE_MODEL_LATENCY_MS=2000 FAKE_MODEL_ERROR_RATE=0.1 python benchmarks/load_test.py --users 50 --stream
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as clock, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "load_test.json")
+LOAD_ROLE = "loadtest"
+GENERATE_LABEL = "🚀 Generate All Drafts"
+TOPIC_LABEL = "🧠 Topic / Product / Feature"
+
+def _percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 1)}
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.failures = {}
+        self.skipped = {}
+
+    def time(self, action: str, at, timeout: float):
+        start = time.perf_counter()
+        at.run(timeout=timeout)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.timings.setdefault(action, []).append(elapsed)
+            if at.exception:
+                self.failures[action] = self.failures.get(action, 0) + 1
+        return at
+
+    def skip(self, action: str):
+        with self._lock:
+            self.skipped[action] = self.skipped.get(action, 0) + 1
+
+def _share_test_runtime():
+    """
+    AppTest.run() installs a mock Runtime singleton and resets it to None when the run ends, so
+    with sessions on several threads one session's teardown pulls the runtime out from under
+    another's script thread, which dies and leaves its run to time out. Install one mock runtime
+    for the whole process and give AppTest a stand-in to set and reset instead.
+    """
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = SimpleNamespace(_instance=runtime)
+
+def simulate_user(index: int, args, recorder: Recorder):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=args.timeout)
+    at.session_state["logged_in_user"] = f"load{index}@example.com"
+    recorder.time("initial_load", at, args.timeout)
+    for iteration in range(args.iterations):
+        next(t for t in at.text_input if t.label == TOPIC_LABEL).set_value(f"Load test topic {index}-{iteration}")
+        at.checkbox(key="force_fresh").set_value(args.force_fresh)
+        at.checkbox(key="stream_drafts").set_value(args.stream)
+        next(b for b in at.button if b.label == GENERATE_LABEL).click()
+        recorder.time("generate", at, args.timeout)
+        if args.schedule:
+            try:
+                date_input = at.date_input(key="twitter_1_date")
+            except KeyError:
+                # Generation failed for twitter this round, so there is no draft to schedule
+                recorder.skip("schedule")
+            else:
+                date_input.set_value(date.today() + timedelta(days=1 + iteration))
+                at.time_input(key="twitter_1_clock").set_value(clock(10, index % 60))
+                at.button(key="twitter_1_btn").click()
+                recorder.time("schedule", at, args.timeout)
+        if args.think_time:
+            time.sleep(args.think_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent users against the Streamlit app, offline.")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="generate/schedule rounds per session")
+    parser.add_argument("--stream", action="store_true", help="stream drafts instead of one combined request")
+    parser.add_argument("--no-force-fresh", dest="force_fresh", action="store_false",
+                        help="allow generation cache hits (topics are unique per round, so this rarely matters)")
+    parser.add_argument("--no-schedule", dest="schedule", action="store_false", help="skip scheduling a draft each round")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds each user pauses between rounds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout in seconds")
+    parser.add_argument("--db", help="database path (default: a fresh temporary database)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="postmuse-load-")
+    # Must be in place before any app module is imported
+    os.environ["MODEL_BACKEND"] = "fake"
+    os.environ["DB_PATH"] = args.db or os.path.join(tmp_dir, "load.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_FILE", os.path.join(tmp_dir, "app.log"))
+    sys.path.insert(0, ROOT)
+    import config
+    import db
+    import metrics
+
+    # Synthetic accounts with an unlimited quota, so the run measures the app rather than the rate limiter
+    config.QUOTA_LIMITS[LOAD_ROLE] = None
+    config.QUOTA_BUCKETS[LOAD_ROLE] = (10 ** 9, 1e-9)
+    db.init_db()
+    for index in range(args.users):
+        db.add_user(f"load{index}@example.com", "load-test", role=LOAD_ROLE)
+
+    _share_test_runtime()
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.users) as pool:
+        futures = [pool.submit(simulate_user, index, args, recorder) for index in range(args.users)]
+    errors = [repr(f.exception()) for f in futures if f.exception()]
+    wall = time.perf_counter() - started
+
+    report = {
+        "config": {**vars(args), "fake_model_latency_ms": config.FAKE_MODEL_LATENCY_MS,
+                   "fake_model_error_rate": config.FAKE_MODEL_ERROR_RATE, "db_path": os.environ["DB_PATH"]},
+        "wall_seconds": round(wall, 2),
+        "generations_per_minute": round(len(recorder.timings.get("generate", [])) / wall * 60, 1),
+        "reruns": {action: _percentiles(samples) for action, samples in recorder.timings.items()},
+        "rerun_exceptions": recorder.failures,
+        "skipped": recorder.skipped,
+        "session_errors": errors,
+        "operations": metrics.snapshot(),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.users} users x {args.iterations} rounds in {report['wall_seconds']}s "
+          f"({report['generations_per_minute']} generations/min)")
+    for action, stats in report["reruns"].items():
+        print(f"  rerun {action}: {stats}")
+    for row in report["operations"]:
+        if row["operation"].startswith(("ui.", "api.", "gemini.")) or row["errors"] or row["p95_ms"] > 50:
+            print(f"  {row['operation']}: n={row['count']} p50 {row['p50_ms']}ms p95 {row['p95_ms']}ms errors {row['errors']}")
+    if errors or recorder.failures:
+        print(f"  session errors: {len(errors)}, reruns with exceptions: {recorder.failures}")
+    print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,75 @@
+import os
+
+# Gemini client settings
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-lite")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))  # in-flight requests per API key, per process
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))  # per attempt
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE_SECONDS = 0.5
+GEMINI_BACKOFF_MAX_SECONDS = 8.0
+GEMINI_GENERATION_CONFIG = {}  # passed to GenerativeModel; part of the generation cache key
+
+# Hedged requests (opt-in): if a request has not answered by the model's recent latency percentile,
+# send a duplicate (to the fallback model when one is set) and keep whichever answers first.
+# The per-model latency comes from metrics.py; until enough samples exist the default delay is used.
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "0") == "1"
+GEMINI_HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_DEFAULT_SECONDS = float(os.getenv("GEMINI_HEDGE_DEFAULT_SECONDS", "3.0"))
+GEMINI_HEDGE_MIN_SECONDS = float(os.getenv("GEMINI_HEDGE_MIN_SECONDS", "0.5"))
+GEMINI_HEDGE_BUDGET = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.1"))  # max hedges as a fraction of requests
+GEMINI_FALLBACK_MODEL_NAME = os.getenv("GEMINI_FALLBACK_MODEL_NAME", "")  # hedge target, and used while the primary's circuit is open
+
+# Circuit breaker per model: open after this many consecutive retryable failures, probe again after the cooldown
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Ask for all platforms in one JSON-mode request; the per-platform prompts below are the fallback
+GEMINI_COMBINED_GENERATION = os.getenv("GEMINI_COMBINED_GENERATION", "1") == "1"
+
+# Model backend: "gemini", or "fake" for an offline stand-in (see model_backend.py)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+FAKE_MODEL_LATENCY_MS = float(os.getenv("FAKE_MODEL_LATENCY_MS", "800"))  # median latency per request
+FAKE_MODEL_LATENCY_SIGMA = float(os.getenv("FAKE_MODEL_LATENCY_SIGMA", "0.5"))  # log-normal spread; 0 = constant
+FAKE_MODEL_ERROR_RATE = float(os.getenv("FAKE_MODEL_ERROR_RATE", "0"))  # fraction of requests failing with a retryable error
+FAKE_MODEL_DRAFT_WORDS = int(os.getenv("FAKE_MODEL_DRAFT_WORDS", "30"))
+FAKE_MODEL_SEED = os.getenv("FAKE_MODEL_SEED")
+
+# Stream per-platform drafts into the tabs as they are written (default for the UI toggle).
+# Streaming sends one request per platform instead of the combined one, so it is off by default.
+GEMINI_STREAM_DRAFTS = os.getenv("GEMINI_STREAM_DRAFTS", "0") == "1"
+
+# Generation cache (rendered prompt -> model response)
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+GENERATION_CACHE_MAX_BYTES = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(20 * 1024 * 1024)))
+GENERATION_CACHE_ACCESS_FLUSH_SECONDS = int(os.getenv("GENERATION_CACHE_ACCESS_FLUSH_SECONDS", "30"))  # batch LRU updates from hits
+
+# Read cache for role, quota and scheduled-post lookups (see read_cache.py)
+READ_CACHE_TTL_SECONDS = int(os.getenv("READ_CACHE_TTL_SECONDS", "60"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "2048"))
+
+# Generation quota per role: total generations allowed (None = unlimited) and a token
+# bucket of (burst size, seconds to refill one token) that limits how fast they can be used
+QUOTA_LIMITS = {"anonymous": 5, "user": 10, "admin": None}
+QUOTA_BUCKETS = {"anonymous": (2, 30.0), "user": (3, 20.0), "admin": (10, 2.0)}
+
+# Retention (see retention.py): days after its schedule time a post stays in scheduled_posts
+# before it is archived, per role (None = keep forever). Roles not listed use RETENTION_DAYS_DEFAULT.
+RETENTION_DAYS = {"anonymous": 7, "user": 90, "admin": None}
+RETENTION_DAYS_DEFAULT = int(os.getenv("RETENTION_DAYS_DEFAULT", "90"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")  # gzipped JSONL segments of archived posts
+RESTORE_HOLD_DAYS = int(os.getenv("RESTORE_HOLD_DAYS", "7"))  # restored posts are not re-archived before this
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))  # sent/failed reminder_outbox rows
+
+# Latency metrics (see metrics.py). A sample rate of 0 leaves decorated functions unwrapped.
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+METRICS_RESERVOIR_SIZE = int(os.getenv("METRICS_RESERVOIR_SIZE", "1024"))  # recent samples kept per operation for percentiles
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # serve Prometheus text on this port when set
+METRICS_FILE = os.getenv("METRICS_FILE", "")  # or write it to this file periodically
+METRICS_FILE_INTERVAL_SECONDS = int(os.getenv("METRICS_FILE_INTERVAL_SECONDS", "15"))
+
 # Prompt templates for different platforms
 PROMPT_TEMPLATES = {
     "twitter": (
@@ -17,6 +89,51 @@ PROMPT_TEMPLATES = {
     )
 }
 
+# Per-platform generation parameters and draft checks (see platforms.py). Stop sequences cut the
+# response off if the model starts a 4th draft or a closing remark after the numbered drafts.
+PLATFORM_SETTINGS = {
+    "twitter": {
+        "max_output_tokens": 400,
+        "temperature": 0.9,
+        "stop_sequences": ["\n4. ", "\n4) "],
+        "max_chars": 280,
+        "require_hashtags": True,  # each draft must use at least one of the hashtags asked for
+    },
+    "linkedin": {
+        "max_output_tokens": 1500,
+        "temperature": 0.7,
+        "stop_sequences": ["\n4. ", "\n4) "],
+        "max_chars": 3000,
+        "require_hashtags": False,
+    },
+    "instagram": {
+        "max_output_tokens": 900,
+        "temperature": 0.9,
+        "stop_sequences": ["\n4. ", "\n4) "],
+        "max_chars": 2200,
+        "require_hashtags": False,
+    },
+}
+# Rounds of regenerating only the drafts that failed their checks (0 disables it)
+GEMINI_REPAIR_ROUNDS = int(os.getenv("GEMINI_REPAIR_ROUNDS", "1"))
+
+# Targeted prompt for replacing rejected drafts; {prompt} is the platform's original prompt
+REPAIR_PROMPT_TEMPLATE = (
+    "{prompt}\n\n"
+    "Some drafts were rejected: {problems}. "
+    "Write only {count} replacement draft(s) that avoid these problems, numbered from 1, "
+    "without any extra explanation or introduction."
+)
+
+# Single-request prompt for all platforms; the response schema asks for one array of drafts per platform
+COMBINED_PROMPT_TEMPLATE = (
+    "Write social media drafts about '{topic}' in a {tone} tone.\n"
+    "twitter: 3 separate Twitter posts under 280 characters each, with emojis and the hashtags {hashtags}.\n"
+    "linkedin: 3 professional LinkedIn posts that include the insight '{insight}'.\n"
+    "instagram: 3 Instagram captions with relevant emojis and a call to action in each.\n"
+    "Return exactly 3 drafts per platform, without numbering, explanation or introduction."
+)
+
 # Available tone options
 TONE_OPTIONS = [
     "casual", "professional", "humorous", "enthusiastic",
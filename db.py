@@ -1,91 +1,212 @@
+import json
 import sqlite3
 import os
-from passlib.context import CryptContext
+import queue
+import socket
+import threading
+import time
+from contextlib import contextmanager
 import streamlit as st
 import logging
 from datetime import datetime
-import pytz
+from migrations import apply_migrations
+from timeutils import IST, to_epoch
+from read_cache import cached_read, invalidate, mark_uncacheable
+import metrics
+import search
 
 logger = logging.getLogger(__name__)
 
-DB_PATH = "data/users.db"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-IST = pytz.timezone("Asia/Kolkata")
-
-def migrate_db():
-    logger.info("Migrating database schema")
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        # Add reminder_minutes column if not exists
-        c.execute("ALTER TABLE scheduled_posts ADD COLUMN reminder_minutes INTEGER NOT NULL DEFAULT 60")
-        # Add reminder_sent column if not exists
-        c.execute("ALTER TABLE scheduled_posts ADD COLUMN reminder_sent BOOLEAN NOT NULL DEFAULT 0")
-        conn.commit()
-        logger.debug("Database schema migrated successfully")
-    except sqlite3.Error as e:
-        if "duplicate column name" not in str(e).lower():
-            logger.error(f"Database migration error: {e}")
-            st.error(f"Database migration error: {e}")
-    finally:
+DB_PATH = os.getenv("DB_PATH", "data/users.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Longest reminder lead time the UI offers (1 day); bounds the reminder scan
+MAX_REMINDER_MINUTES = 1440
+# Saved generations kept per user, and edit versions kept per draft
+DRAFT_BATCHES_KEPT = int(os.getenv("DRAFT_BATCHES_KEPT", "50"))
+DRAFT_VERSIONS_KEPT = int(os.getenv("DRAFT_VERSIONS_KEPT", "20"))
+# Newest matching posts a user's search ranks (see search.py)
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+
+# Applied to every new connection. WAL lets readers run alongside a writer,
+# and synchronous=NORMAL is durable enough under WAL while avoiding an fsync
+# per commit. auto_vacuum only takes effect on a new, empty database; older
+# files are converted once with `python retention.py --convert-vacuum`.
+SQLITE_PRAGMAS = (
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 134217728",
+)
+
+class ConnectionPool:
+    """
+    Pool of reusable SQLite connections shared by all threads of the process.
+
+    A thread holds at most one connection at a time: nested transaction()
+    calls on the same thread reuse it. Writes take a process-wide lock and
+    BEGIN IMMEDIATE, so concurrent writers queue up instead of failing with
+    "database is locked" halfway through a transaction.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,  # connections move between threads via the pool
+        )
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        logger.debug(f"Opened new SQLite connection to {self.path}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
         try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
             conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+    @contextmanager
+    def transaction(self, write: bool = False):
+        conn = getattr(self._local, "conn", None)
+        owner = conn is None
+        if owner:
+            conn = self.acquire()
+            self._local.conn = conn
+        try:
+            if write and not conn.in_transaction:
+                with self._write_lock:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        yield conn
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                    conn.commit()
+            else:
+                yield conn
+        except sqlite3.Error:
+            # Callers swallow DB errors and return defaults; still count them against the timed operation
+            metrics.mark_error()
+            raise
+        finally:
+            if owner:
+                self._local.conn = None
+                self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+_pwd_context = None
+_pwd_context_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None or _pool.path != DB_PATH:
+        with _pool_lock:
+            if _pool is None or _pool.path != DB_PATH:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def password_context():
+    """bcrypt context, created on first use so passlib and bcrypt stay off the import path."""
+    global _pwd_context
+    if _pwd_context is None:
+        with _pwd_context_lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+                _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+def transaction(write: bool = False):
+    """
+    Context manager yielding a pooled connection.
+    With write=True the block runs inside BEGIN IMMEDIATE ... COMMIT and is rolled back on error.
+    """
+    return get_pool().transaction(write)
+
+_db_initialized = False
+_init_lock = threading.Lock()
+
+@metrics.timed()
 def init_db():
-    logger.info("Initializing database")
-    try:
-        os.makedirs("data", exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL DEFAULT 'user',
-                api_calls INTEGER NOT NULL DEFAULT 0
-            )
-        """)
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS scheduled_posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_email TEXT NOT NULL,
-                platform TEXT NOT NULL,
-                content TEXT NOT NULL,
-                schedule_time TEXT NOT NULL,
-                reminder_minutes INTEGER NOT NULL DEFAULT 60,
-                reminder_sent BOOLEAN NOT NULL DEFAULT 0
-            )
-        """)
-        # Add default admin account if it doesn't exist
-        c.execute("SELECT email FROM users WHERE email = 'admin'")
-        if not c.fetchone():
-            hashed = pwd_context.hash("pass99()")
-            c.execute("INSERT INTO users (email, password, role) VALUES (?, ?, ?)", 
-                     ('admin', hashed, 'admin'))
-        conn.commit()
-        logger.debug("Database tables created successfully with admin account")
-        migrate_db()  # Run migration for existing DBs
-    except sqlite3.Error as e:
-        logger.error(f"Database initialization error: {e}")
-        st.error(f"Database initialization error: {e}")
-        raise
-    finally:
+    """
+    Bring the schema up to date and seed the admin account.
+    Runs once per process; later calls (e.g. on every Streamlit rerun) return immediately.
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _init_lock:
+        if _db_initialized:
+            return
+        logger.info("Initializing database")
         try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
+            with transaction(write=True) as conn:
+                version = apply_migrations(conn)
+            logger.debug(f"Database schema at version {version}")
+            # Add default admin account if it doesn't exist
+            with transaction() as conn:
+                has_admin = conn.execute("SELECT 1 FROM users WHERE email = 'admin'").fetchone()
+            if not has_admin:
+                hashed = password_context().hash("pass99()")
+                with transaction(write=True) as conn:
+                    conn.execute("INSERT OR IGNORE INTO users (email, password, role) VALUES (?, ?, ?)",
+                                 ('admin', hashed, 'admin'))
+                logger.debug("Default admin account created")
+            _db_initialized = True
+        except sqlite3.Error as e:
+            logger.error(f"Database initialization error: {e}")
+            st.error(f"Database initialization error: {e}")
+            raise
 
+@metrics.timed()
 def add_user(email: str, password: str, role="user"):
     logger.info(f"Attempting to add user: {email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        hashed = pwd_context.hash(password)
-        c.execute("INSERT INTO users (email, password, role) VALUES (?, ?, ?)", (email, hashed, role))
-        conn.commit()
+        # Hash before taking the write lock; bcrypt is deliberately slow
+        with metrics.timer("db.add_user.bcrypt"):
+            hashed = password_context().hash(password)
+        with transaction(write=True) as conn:
+            conn.execute("INSERT INTO users (email, password, role) VALUES (?, ?, ?)", (email, hashed, role))
+        invalidate("users", f"user:{email}")
         logger.debug(f"User {email} added successfully")
         return True
     except sqlite3.IntegrityError:
@@ -95,20 +216,17 @@ def add_user(email: str, password: str, role="user"):
         logger.error(f"Database error during user addition: {e}")
         st.error(f"Database error during user addition: {e}")
         return False
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
 def verify_user(email: str, password: str):
     logger.info(f"Verifying user: {email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT password FROM users WHERE email = ?", (email,))
-        row = c.fetchone()
-        if row and pwd_context.verify(password, row[0]):
+        with transaction() as conn:
+            row = conn.execute("SELECT password FROM users WHERE email = ?", (email,)).fetchone()
+        # Verify after the connection is back in the pool
+        with metrics.timer("db.verify_user.bcrypt"):
+            verified = bool(row) and password_context().verify(password, row[0])
+        if verified:
             logger.debug(f"User {email} verified successfully")
             return True
         logger.warning(f"Invalid credentials for user: {email}")
@@ -117,216 +235,893 @@ def verify_user(email: str, password: str):
         logger.error(f"Database error during user verification: {e}")
         st.error(f"Database error during user verification: {e}")
         return False
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@cached_read("user:{0}")
+@metrics.timed()
 def get_user_role(email: str):
     logger.info(f"Fetching role for user: {email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT role FROM users WHERE email = ?", (email,))
-        row = c.fetchone()
+        with transaction() as conn:
+            row = conn.execute("SELECT role FROM users WHERE email = ?", (email,)).fetchone()
         role = row[0] if row else None
         logger.debug(f"User {email} role: {role}")
         return role
     except sqlite3.Error as e:
         logger.error(f"Database error fetching user role: {e}")
         st.error(f"Database error fetching user role: {e}")
+        mark_uncacheable()
         return None
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@cached_read("user:{0}")
+@metrics.timed()
 def get_api_calls(email: str):
     logger.info(f"Fetching API calls for user: {email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT api_calls FROM users WHERE email = ?", (email,))
-        row = c.fetchone()
+        with transaction() as conn:
+            row = conn.execute("SELECT api_calls FROM users WHERE email = ?", (email,)).fetchone()
         calls = row[0] if row else 0
         logger.debug(f"API calls for {email}: {calls}")
         return calls
     except sqlite3.Error as e:
         logger.error(f"Database error fetching API call count: {e}")
         st.error(f"Database error fetching API call count: {e}")
+        mark_uncacheable()
         return 0
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
 def increment_api_calls(email: str):
     logger.info(f"Incrementing API calls for user: {email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE users SET api_calls = api_calls + 1 WHERE email = ?", (email,))
-        conn.commit()
+        with transaction(write=True) as conn:
+            conn.execute("UPDATE users SET api_calls = api_calls + 1 WHERE email = ?", (email,))
+        invalidate("users", f"user:{email}")
         logger.debug(f"API calls incremented for {email}")
     except sqlite3.Error as e:
         logger.error(f"Database error incrementing API call count: {e}")
         st.error(f"Database error incrementing API call count: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
+def update_user(email: str, role: str = None, api_calls: int = None):
+    logger.info(f"Updating user: {email}")
+    try:
+        updates = []
+        params = []
+        if role is not None:
+            updates.append("role = ?")
+            params.append(role)
+        if api_calls is not None:
+            updates.append("api_calls = ?")
+            params.append(api_calls)
+        if updates:
+            params.append(email)
+            query = f"UPDATE users SET {', '.join(updates)} WHERE email = ?"
+            with transaction(write=True) as conn:
+                conn.execute(query, params)
+            invalidate("users", f"user:{email}")
+            logger.debug(f"User {email} updated successfully")
+        else:
+            logger.debug("No updates provided for user")
+    except sqlite3.Error as e:
+        logger.error(f"Database error updating user: {e}")
+        st.error(f"Database error updating user: {e}")
+
+@metrics.timed()
+def delete_user(email: str):
+    logger.info(f"Deleting user: {email}")
+    try:
+        with transaction(write=True) as conn:
+            conn.execute("DELETE FROM users WHERE email = ?", (email,))
+            conn.execute("DELETE FROM scheduled_posts WHERE user_email = ?", (email,))
+            conn.execute("DELETE FROM drafts WHERE batch_id IN (SELECT id FROM draft_batches WHERE user_email = ?)", (email,))
+            conn.execute("DELETE FROM draft_batches WHERE user_email = ?", (email,))
+        invalidate("users", f"user:{email}", "posts", f"posts:{email}", f"drafts:{email}")
+        logger.debug(f"User {email}, their scheduled posts and drafts deleted successfully")
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting user: {e}")
+        st.error(f"Database error deleting user: {e}")
+
+def _post_row(user_email, platform, content, schedule_time, reminder_minutes):
+    """Normalize one post into scheduled_posts column values; raises ValueError on a bad time."""
+    if reminder_minutes > MAX_REMINDER_MINUTES:
+        logger.warning(f"Reminder of {reminder_minutes} min clamped to {MAX_REMINDER_MINUTES} min")
+        reminder_minutes = MAX_REMINDER_MINUTES
+    # Ensure schedule_time is stored in IST ISO format
+    if isinstance(schedule_time, datetime):
+        schedule_time = schedule_time.astimezone(IST).isoformat()
+    schedule_at = to_epoch(schedule_time)
+    return (user_email, platform, content, schedule_time, reminder_minutes, schedule_at, schedule_at - reminder_minutes * 60)
+
+_INSERT_POST_SQL = "INSERT INTO scheduled_posts (user_email, platform, content, schedule_time, reminder_minutes, schedule_at, remind_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+@metrics.timed()
 def schedule_post(user_email, platform, content, schedule_time, reminder_minutes=60):
     logger.info(f"Scheduling post for user: {user_email}, platform: {platform}, reminder: {reminder_minutes} min before")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        # Ensure schedule_time is stored in IST ISO format
-        if isinstance(schedule_time, datetime):
-            schedule_time = schedule_time.astimezone(IST).isoformat()
-        c.execute(
-            "INSERT INTO scheduled_posts (user_email, platform, content, schedule_time, reminder_minutes) VALUES (?, ?, ?, ?, ?)",
-            (user_email, platform, content, schedule_time, reminder_minutes)
-        )
-        conn.commit()
-        logger.debug(f"Post scheduled successfully for {user_email} on {platform} at {schedule_time}")
+        row = _post_row(user_email, platform, content, schedule_time, reminder_minutes)
+        with transaction(write=True) as conn:
+            conn.execute(_INSERT_POST_SQL, row)
+        invalidate("posts", f"posts:{user_email}")
+        logger.debug(f"Post scheduled successfully for {user_email} on {platform} at {row[3]}")
     except sqlite3.Error as e:
         logger.error(f"Database error scheduling post: {e}")
         st.error(f"Database error scheduling post: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
+def schedule_posts_bulk(posts) -> int:
+    """
+    Schedule many posts in a single write transaction.
+    posts is an iterable of (user_email, platform, content, schedule_time, reminder_minutes).
+    Every row is normalized before anything is written, so a bad schedule_time
+    raises ValueError and schedules nothing. Returns the number of posts scheduled.
+    """
+    rows = [_post_row(*post) for post in posts]
+    if not rows:
+        return 0
+    logger.info(f"Bulk scheduling {len(rows)} posts")
+    try:
+        with transaction(write=True) as conn:
+            conn.executemany(_INSERT_POST_SQL, rows)
+        invalidate("posts", *{f"posts:{row[0]}" for row in rows})
+        logger.debug(f"Bulk scheduled {len(rows)} posts")
+        return len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Database error bulk scheduling posts: {e}")
+        st.error(f"Database error bulk scheduling posts: {e}")
+        return 0
+
+@cached_read("posts:{0}")
+@metrics.timed()
 def get_user_scheduled_posts(user_email):
     logger.info(f"Fetching scheduled posts for user: {user_email}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, platform, content, schedule_time, reminder_minutes FROM scheduled_posts WHERE user_email = ? ORDER BY schedule_time",
-            (user_email,)
-        )
-        posts = c.fetchall()
+        with transaction() as conn:
+            posts = conn.execute(
+                "SELECT id, platform, content, schedule_time, reminder_minutes FROM scheduled_posts WHERE user_email = ? ORDER BY schedule_at, id",
+                (user_email,)
+            ).fetchall()
         logger.debug(f"Retrieved {len(posts)} scheduled posts for {user_email}")
         return posts
     except sqlite3.Error as e:
         logger.error(f"Database error fetching scheduled posts: {e}")
         st.error(f"Database error fetching scheduled posts: {e}")
+        mark_uncacheable()
         return []
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
 def get_reminder_posts():
     """
-    Fetch posts where reminder is due: schedule_time - reminder_minutes <= now (IST) and reminder not sent.
+    Fetch posts where reminder is due: remind_at <= now < schedule_at and reminder not sent.
     Returns list of (user_email, platform, content, schedule_time, reminder_minutes, id)
     """
     logger.info("Fetching due reminder posts")
-    now = datetime.now(IST).isoformat()
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            SELECT user_email, platform, content, schedule_time, reminder_minutes, id
-            FROM scheduled_posts
-            WHERE reminder_sent = 0
-            AND schedule_time > ?
-            AND ? >= datetime(schedule_time, '-' || reminder_minutes || ' minutes')
-            ORDER BY schedule_time
-        """, (now, now))
-        posts = c.fetchall()
+    now = int(time.time())
+    try:
+        with transaction() as conn:
+            # The lower bound on remind_at keeps this a bounded range scan of the
+            # partial index: anything older belongs to a post already in the past.
+            posts = conn.execute("""
+                SELECT user_email, platform, content, schedule_time, reminder_minutes, id
+                FROM scheduled_posts
+                WHERE reminder_sent = 0
+                AND remind_at > ? AND remind_at <= ?
+                AND schedule_at > ?
+                ORDER BY remind_at
+            """, (now - MAX_REMINDER_MINUTES * 60, now, now)).fetchall()
         logger.debug(f"Retrieved {len(posts)} due reminder posts")
         return posts
     except sqlite3.Error as e:
         logger.error(f"Database error fetching reminder posts: {e}")
         st.error(f"Database error fetching reminder posts: {e}")
         return []
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
 def mark_reminder_sent(post_id):
     """
     Mark a post's reminder as sent.
     """
     logger.info(f"Marking reminder sent for post ID: {post_id}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE scheduled_posts SET reminder_sent = 1 WHERE id = ?", (post_id,))
-        conn.commit()
+        with transaction(write=True) as conn:
+            conn.execute("UPDATE scheduled_posts SET reminder_sent = 1 WHERE id = ?", (post_id,))
         logger.debug(f"Reminder marked sent for post {post_id}")
     except sqlite3.Error as e:
         logger.error(f"Database error marking reminder sent: {e}")
         st.error(f"Database error marking reminder sent: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@metrics.timed()
+def get_upcoming_reminders(until: int, after_id: int = 0):
+    """
+    Fetch unsent reminders due at or before `until` (UTC epoch) for posts still in the future.
+    Only posts with id > after_id are considered, so callers can poll for new posts cheaply.
+    Returns (list of (remind_at, id), last_id) where last_id is the highest post id seen
+    and can be passed back as after_id on the next call.
+    """
+    logger.info(f"Fetching upcoming reminders until {until} after post ID {after_id}")
+    now = int(time.time())
+    try:
+        with transaction() as conn:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM scheduled_posts").fetchone()[0]
+            if after_id:
+                # New posts only: a rowid range scan rather than the remind_at index
+                query = """
+                    SELECT remind_at, id FROM scheduled_posts
+                    WHERE id > ? AND id <= ?
+                    AND reminder_sent = 0 AND remind_at <= ? AND schedule_at > ?
+                """
+                params = (after_id, last_id, until, now)
+            else:
+                query = """
+                    SELECT remind_at, id FROM scheduled_posts
+                    WHERE reminder_sent = 0
+                    AND remind_at > ? AND remind_at <= ?
+                    AND schedule_at > ? AND id <= ?
+                """
+                params = (now - MAX_REMINDER_MINUTES * 60, until, now, last_id)
+            reminders = conn.execute(query, params).fetchall()
+        logger.debug(f"Retrieved {len(reminders)} upcoming reminders")
+        return reminders, max(last_id, after_id)
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching upcoming reminders: {e}")
+        st.error(f"Database error fetching upcoming reminders: {e}")
+        return [], after_id
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+@metrics.timed()
+def enqueue_due_reminders(render, limit: int = 500, render_html=None) -> int:
+    """
+    Move up to `limit` due reminders into reminder_outbox in one transaction: each post gets
+    an outbox row with the body from render(platform, content, schedule_time, reminder_minutes)
+    (and an HTML body from render_html, called the same way, when given) and is marked
+    reminder_sent, so every reminder is enqueued exactly once however many workers run. Posts whose owner is not an email address are recorded as failed.
+    Returns the number of posts enqueued.
+    """
+    logger.info(f"Enqueueing up to {limit} due reminders")
+    now = int(time.time())
+    try:
+        with transaction(write=True) as conn:
+            posts = conn.execute("""
+                SELECT user_email, platform, content, schedule_time, reminder_minutes, id
+                FROM scheduled_posts
+                WHERE reminder_sent = 0
+                AND remind_at > ? AND remind_at <= ?
+                AND schedule_at > ?
+                ORDER BY remind_at
+                LIMIT ?
+            """, (now - MAX_REMINDER_MINUTES * 60, now, now, limit)).fetchall()
+            rows = []
+            for user_email, platform, content, schedule_time, reminder_minutes, post_id in posts:
+                valid = "@" in user_email
+                rows.append((
+                    post_id, user_email, render(platform, content, schedule_time, reminder_minutes),
+                    render_html(platform, content, schedule_time, reminder_minutes) if render_html else None,
+                    "pending" if valid else "failed", None if valid else "recipient is not an email address",
+                    now, now
+                ))
+            conn.executemany("""
+                INSERT OR IGNORE INTO reminder_outbox (post_id, recipient, body, html_body, state, last_error, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.executemany(
+                "UPDATE scheduled_posts SET reminder_sent = 1 WHERE id = ?",
+                [(post[5],) for post in posts]
+            )
+        logger.debug(f"Enqueued {len(posts)} reminders")
+        return len(posts)
+    except sqlite3.Error as e:
+        logger.error(f"Database error enqueueing reminders: {e}")
+        st.error(f"Database error enqueueing reminders: {e}")
+        return 0
+
+@metrics.timed()
+def claim_outbox(limit: int = 100, worker_id: str = None, lease_seconds: int = 300, max_attempts: int = 5):
+    """
+    Lease up to `limit` pending outbox rows whose retry time has come, counting an attempt on each.
+    Rows that already used max_attempts (e.g. every attempt crashed its worker) are failed instead.
+    Returns list of (id, recipient, body, html_body, attempts); html_body may be None
+    """
+    worker_id = worker_id or default_worker_id()
+    logger.info(f"Claiming up to {limit} outbox messages for worker {worker_id}")
+    now = int(time.time())
+    try:
+        with transaction(write=True) as conn:
+            conn.execute("""
+                UPDATE reminder_outbox SET state = 'failed', claimed_by = NULL, claim_expires = NULL,
+                    last_error = COALESCE(last_error, 'delivery abandoned after repeated lease expiry')
+                WHERE state = 'pending' AND next_attempt_at <= ? AND attempts >= ?
+                AND (claim_expires IS NULL OR claim_expires <= ?)
+            """, (now, max_attempts, now))
+            rows = conn.execute("""
+                SELECT id, recipient, body, html_body, attempts FROM reminder_outbox
+                WHERE state = 'pending' AND next_attempt_at <= ?
+                AND (claim_expires IS NULL OR claim_expires <= ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            """, (now, now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE reminder_outbox SET claimed_by = ?, claim_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker_id, now + lease_seconds, row[0]) for row in rows]
+            )
+        logger.debug(f"Worker {worker_id} claimed {len(rows)} outbox messages")
+        return [(outbox_id, recipient, body, html_body, attempts + 1)
+                for outbox_id, recipient, body, html_body, attempts in rows]
+    except sqlite3.Error as e:
+        logger.error(f"Database error claiming outbox messages: {e}")
+        st.error(f"Database error claiming outbox messages: {e}")
+        return []
+
+@metrics.timed()
+def complete_outbox(sent_ids, failures, worker_id: str = None, max_attempts: int = 5,
+                    retry_base_seconds: int = 60, retry_max_seconds: int = 3600):
+    """
+    Record delivery results for outbox rows claimed by `worker_id` in one transaction.
+    failures is a list of (id, attempts, error, permanent); transient failures are retried with
+    exponential backoff until max_attempts. Rows whose lease was lost are left alone, so each
+    delivery is accounted exactly once. Returns (sent, failed) counts actually recorded.
+    """
+    worker_id = worker_id or default_worker_id()
+    logger.info(f"Completing {len(sent_ids)} sent and {len(failures)} failed outbox messages for worker {worker_id}")
+    now = int(time.time())
+    try:
+        with transaction(write=True) as conn:
+            sent = conn.executemany("""
+                UPDATE reminder_outbox SET state = 'sent', sent_at = ?, last_error = NULL, claimed_by = NULL, claim_expires = NULL
+                WHERE id = ? AND claimed_by = ? AND state = 'pending'
+            """, [(now, outbox_id, worker_id) for outbox_id in sent_ids]).rowcount
+            failed = conn.executemany("""
+                UPDATE reminder_outbox SET state = ?, next_attempt_at = ?, last_error = ?, claimed_by = NULL, claim_expires = NULL
+                WHERE id = ? AND claimed_by = ? AND state = 'pending'
+            """, [
+                ("failed" if permanent or attempts >= max_attempts else "pending",
+                 now + min(retry_max_seconds, retry_base_seconds * 2 ** (attempts - 1)),
+                 error[:500], outbox_id, worker_id)
+                for outbox_id, attempts, error, permanent in failures
+            ]).rowcount
+        logger.debug(f"Recorded {sent} sent and {failed} failed outbox messages")
+        return sent, failed
+    except sqlite3.Error as e:
+        logger.error(f"Database error completing outbox messages: {e}")
+        st.error(f"Database error completing outbox messages: {e}")
+        return 0, 0
+
+@metrics.timed()
+def next_outbox_attempt_at():
+    """Earliest next_attempt_at (UTC epoch) among pending outbox rows, or None."""
+    try:
+        with transaction() as conn:
+            return conn.execute("SELECT MIN(next_attempt_at) FROM reminder_outbox WHERE state = 'pending'").fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Database error reading the outbox retry schedule: {e}")
+        st.error(f"Database error reading the outbox retry schedule: {e}")
+        return None
+
+@metrics.timed()
+def count_outbox_by_state() -> dict:
+    try:
+        with transaction() as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM reminder_outbox GROUP BY state").fetchall())
+    except sqlite3.Error as e:
+        logger.error(f"Database error counting outbox messages: {e}")
+        st.error(f"Database error counting outbox messages: {e}")
+        return {}
+
+@metrics.timed()
+def save_draft_batch(user_email: str, prompt_vars: dict, drafts: dict):
+    """
+    Save one generation ({platform: [draft, ...]}) as a new batch, keeping the user's
+    newest DRAFT_BATCHES_KEPT batches. Returns the batch id, or None if nothing was saved.
+    """
+    rows = [(platform, position, content)
+            for platform, items in drafts.items() for position, content in enumerate(items, 1)]
+    if not rows:
+        return None
+    logger.info(f"Saving {len(rows)} drafts for {user_email}")
+    now = int(time.time())
+    try:
+        with transaction(write=True) as conn:
+            batch_id = conn.execute(
+                "INSERT INTO draft_batches (user_email, topic, prompt_vars, created_at) VALUES (?, ?, ?, ?)",
+                (user_email, prompt_vars.get("topic", ""), json.dumps(prompt_vars), now)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO drafts (batch_id, platform, position, version, content, created_at) VALUES (?, ?, ?, 1, ?, ?)",
+                [(batch_id, platform, position, content, now) for platform, position, content in rows]
+            )
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM draft_batches WHERE user_email = ? ORDER BY id DESC LIMIT -1 OFFSET ?",
+                (user_email, DRAFT_BATCHES_KEPT)
+            )]
+            conn.executemany("DELETE FROM drafts WHERE batch_id = ?", [(i,) for i in expired])
+            conn.executemany("DELETE FROM draft_batches WHERE id = ?", [(i,) for i in expired])
+        invalidate(f"drafts:{user_email}")
+        logger.debug(f"Saved draft batch {batch_id} for {user_email}")
+        return batch_id
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving drafts: {e}")
+        st.error(f"Database error saving drafts: {e}")
+        return None
+
+@cached_read("drafts:{0}")
+@metrics.timed()
+def get_draft_batches(user_email: str, limit: int = 20):
+    """The user's newest generations, without their drafts. Returns list of (id, topic, created_at)."""
+    try:
+        with transaction() as conn:
+            return conn.execute(
+                "SELECT id, topic, created_at FROM draft_batches WHERE user_email = ? ORDER BY id DESC LIMIT ?",
+                (user_email, limit)
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching draft batches: {e}")
+        st.error(f"Database error fetching draft batches: {e}")
+        mark_uncacheable()
+        return []
+
+@cached_read("drafts:{0}")
+@metrics.timed()
+def get_batch_drafts(user_email: str, batch_id: int) -> dict:
+    """Current version of every draft in one of the user's batches, as {platform: [draft, ...]}."""
+    try:
+        with transaction() as conn:
+            # SQLite takes the bare content column from the row holding MAX(version)
+            rows = conn.execute("""
+                SELECT d.platform, d.content, MAX(d.version) FROM drafts d
+                JOIN draft_batches b ON b.id = d.batch_id
+                WHERE d.batch_id = ? AND b.user_email = ?
+                GROUP BY d.platform, d.position
+                ORDER BY d.platform, d.position
+            """, (batch_id, user_email)).fetchall()
+        drafts = {}
+        for platform, content, _ in rows:
+            drafts.setdefault(platform, []).append(content)
+        return drafts
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching drafts: {e}")
+        st.error(f"Database error fetching drafts: {e}")
+        mark_uncacheable()
+        return {}
+
+@metrics.timed()
+def save_draft_edit(user_email: str, batch_id: int, platform: str, position: int, content: str):
+    """
+    Record an edit as the draft's next version, keeping the newest DRAFT_VERSIONS_KEPT.
+    Unchanged content adds nothing. Returns the current version, or None if the draft is not the user's.
+    """
+    try:
+        with transaction(write=True) as conn:
+            row = conn.execute("""
+                SELECT d.version, d.content FROM drafts d JOIN draft_batches b ON b.id = d.batch_id
+                WHERE d.batch_id = ? AND b.user_email = ? AND d.platform = ? AND d.position = ?
+                ORDER BY d.version DESC LIMIT 1
+            """, (batch_id, user_email, platform, position)).fetchone()
+            if row is None or row[1] == content:
+                return row[0] if row else None
+            version = row[0] + 1
+            conn.execute(
+                "INSERT INTO drafts (batch_id, platform, position, version, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (batch_id, platform, position, version, content, int(time.time()))
+            )
+            conn.execute(
+                "DELETE FROM drafts WHERE batch_id = ? AND platform = ? AND position = ? AND version <= ?",
+                (batch_id, platform, position, version - DRAFT_VERSIONS_KEPT)
+            )
+        invalidate(f"drafts:{user_email}")
+        logger.debug(f"Saved version {version} of {platform} draft {position} in batch {batch_id}")
+        return version
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving draft edit: {e}")
+        st.error(f"Database error saving draft edit: {e}")
+        return None
+
+@metrics.timed()
+def get_draft_history(user_email: str, batch_id: int, platform: str, position: int):
+    """Every kept version of one draft, newest first. Returns list of (version, content, created_at)."""
+    try:
+        with transaction() as conn:
+            return conn.execute("""
+                SELECT d.version, d.content, d.created_at FROM drafts d JOIN draft_batches b ON b.id = d.batch_id
+                WHERE d.batch_id = ? AND b.user_email = ? AND d.platform = ? AND d.position = ?
+                ORDER BY d.version DESC
+            """, (batch_id, user_email, platform, position)).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching draft history: {e}")
+        st.error(f"Database error fetching draft history: {e}")
+        return []
+
+@metrics.timed()
+def delete_draft_batch(user_email: str, batch_id: int):
+    logger.info(f"Deleting draft batch {batch_id} for {user_email}")
+    try:
+        with transaction(write=True) as conn:
+            if conn.execute("DELETE FROM draft_batches WHERE id = ? AND user_email = ?", (batch_id, user_email)).rowcount:
+                conn.execute("DELETE FROM drafts WHERE batch_id = ?", (batch_id,))
+        invalidate(f"drafts:{user_email}")
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting draft batch: {e}")
+        st.error(f"Database error deleting draft batch: {e}")
+
+@cached_read("users")
+@metrics.timed()
 def get_all_users():
     logger.info("Fetching all users")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT email, role, api_calls FROM users")
-        users = c.fetchall()
+        with transaction() as conn:
+            users = conn.execute("SELECT email, role, api_calls FROM users").fetchall()
         logger.debug(f"Retrieved {len(users)} users")
         return users
     except sqlite3.Error as e:
         logger.error(f"Database error fetching all users: {e}")
         st.error(f"Database error fetching all users: {e}")
+        mark_uncacheable()
         return []
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@cached_read("posts")
+@metrics.timed()
 def get_all_scheduled_posts():
     logger.info("Fetching all scheduled posts")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT id, user_email, platform, content, schedule_time, reminder_minutes FROM scheduled_posts ORDER BY schedule_time")
-        posts = c.fetchall()
+        with transaction() as conn:
+            posts = conn.execute("SELECT id, user_email, platform, content, schedule_time, reminder_minutes FROM scheduled_posts ORDER BY schedule_time").fetchall()
         logger.debug(f"Retrieved {len(posts)} scheduled posts")
         return posts
     except sqlite3.Error as e:
         logger.error(f"Database error fetching all scheduled posts: {e}")
         st.error(f"Database error fetching all scheduled posts: {e}")
+        mark_uncacheable()
         return []
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
 
+@cached_read("users")
+@metrics.timed()
+def count_users():
+    logger.info("Counting users")
+    try:
+        with transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Database error counting users: {e}")
+        st.error(f"Database error counting users: {e}")
+        mark_uncacheable()
+        return 0
+
+@cached_read("users")
+@metrics.timed()
+def get_users_page(after_email: str = None, limit: int = 50):
+    """
+    Keyset-paginated users ordered by email. Pass the last email of the previous page as after_email.
+    Returns list of (email, role, api_calls)
+    """
+    logger.info(f"Fetching users page after {after_email!r}")
+    try:
+        with transaction() as conn:
+            users = conn.execute(
+                "SELECT email, role, api_calls FROM users WHERE email > ? ORDER BY email LIMIT ?",
+                (after_email or "", limit)
+            ).fetchall()
+        logger.debug(f"Retrieved {len(users)} users")
+        return users
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching users page: {e}")
+        st.error(f"Database error fetching users page: {e}")
+        mark_uncacheable()
+        return []
+
+def _post_filters(platform=None, user_email=None, start_at=None, end_at=None, reminder_sent=None):
+    """Build a WHERE clause for scheduled_posts; start_at/end_at are UTC epochs, end exclusive."""
+    clauses, params = [], []
+    if platform:
+        clauses.append("platform = ?")
+        params.append(platform)
+    if user_email:
+        clauses.append("user_email = ?")
+        params.append(user_email)
+    if start_at is not None:
+        clauses.append("schedule_at >= ?")
+        params.append(start_at)
+    if end_at is not None:
+        clauses.append("schedule_at < ?")
+        params.append(end_at)
+    if reminder_sent is not None:
+        clauses.append("reminder_sent = ?")
+        params.append(int(reminder_sent))
+    return clauses, params
+
+@cached_read("posts")
+@metrics.timed()
+def count_scheduled_posts(platform=None, user_email=None, start_at=None, end_at=None, reminder_sent=None):
+    logger.info("Counting scheduled posts")
+    clauses, params = _post_filters(platform, user_email, start_at, end_at, reminder_sent)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    try:
+        with transaction() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM scheduled_posts {where}", params).fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Database error counting scheduled posts: {e}")
+        st.error(f"Database error counting scheduled posts: {e}")
+        mark_uncacheable()
+        return 0
+
+@cached_read("posts")
+@metrics.timed()
+def get_scheduled_posts_page(after=None, limit: int = 50, platform=None, user_email=None,
+                             start_at=None, end_at=None, reminder_sent=None, preview_chars: int = 80):
+    """
+    Keyset-paginated scheduled posts ordered by (schedule_at, id), with optional filters.
+    Pass the (schedule_at, id) of the last row of the previous page as after.
+    Only a preview of the content is returned; use get_post_content for the full text.
+    Returns list of (id, user_email, platform, preview, schedule_time, reminder_minutes, reminder_sent, schedule_at)
+    """
+    logger.info(f"Fetching scheduled posts page after {after}")
+    clauses, params = _post_filters(platform, user_email, start_at, end_at, reminder_sent)
+    if after is not None:
+        clauses.append("(schedule_at, id) > (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    try:
+        with transaction() as conn:
+            posts = conn.execute(f"""
+                SELECT id, user_email, platform, substr(content, 1, ?), schedule_time, reminder_minutes, reminder_sent, schedule_at
+                FROM scheduled_posts
+                {where}
+                ORDER BY schedule_at, id
+                LIMIT ?
+            """, [preview_chars, *params, limit]).fetchall()
+        logger.debug(f"Retrieved {len(posts)} scheduled posts")
+        return posts
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching scheduled posts page: {e}")
+        st.error(f"Database error fetching scheduled posts page: {e}")
+        mark_uncacheable()
+        return []
+
+def _owner_token(user_email: str) -> str:
+    # Same value as 'u' || hex(user_email) in the search index (migrations.ensure_search_index)
+    return "u" + user_email.encode("utf-8").hex()
+
+@cached_read("posts")
+@metrics.timed()
+def search_scheduled_posts(text: str, user_email: str = None, limit: int = 20):
+    """
+    Full-text search over scheduled post content, best matches first. Every word must match;
+    the last one also matches as a prefix. A user's search ranks their SEARCH_CANDIDATES newest
+    matches (see search.py); an admin search over all posts is ranked by FTS5's bm25.
+    Returns list of (id, user_email, platform, snippet, schedule_time, reminder_minutes)
+    """
+    logger.info(f"Searching scheduled posts for {text!r} (user: {user_email})")
+    query_terms = search.terms(text)
+    if not query_terms:
+        return []
+    match = f"content : ({search.fts_terms(query_terms)})"
+    try:
+        with transaction() as conn:
+            try:
+                if user_email:
+                    # The owner term keeps FTS5 inside this user's posts; rowid order needs no scoring
+                    candidates = conn.execute("""
+                        SELECT p.id, p.user_email, p.platform, p.content, p.schedule_time, p.reminder_minutes
+                        FROM scheduled_posts_fts
+                        JOIN scheduled_posts p ON p.id = scheduled_posts_fts.rowid
+                        WHERE scheduled_posts_fts MATCH ?
+                        ORDER BY scheduled_posts_fts.rowid DESC
+                        LIMIT ?
+                    """, (f"owner : {_owner_token(user_email)} AND {match}", SEARCH_CANDIDATES)).fetchall()
+                    posts = [(post_id, email, platform, search.snippet(content, query_terms), schedule_time, reminder_minutes)
+                             for post_id, email, platform, content, schedule_time, reminder_minutes
+                             in search.rank(query_terms, candidates, 3, limit)]
+                else:
+                    posts = conn.execute("""
+                        SELECT p.id, p.user_email, p.platform,
+                               snippet(scheduled_posts_fts, 0, '**', '**', '…', 16),
+                               p.schedule_time, p.reminder_minutes
+                        FROM scheduled_posts_fts
+                        JOIN scheduled_posts p ON p.id = scheduled_posts_fts.rowid
+                        WHERE scheduled_posts_fts MATCH ?
+                        ORDER BY rank
+                        LIMIT ?
+                    """, (match, limit)).fetchall()
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+                # SQLite without FTS5 (see migrations.ensure_search_index): plain substring scan
+                user_clause = "AND p.user_email = ?" if user_email else ""
+                posts = conn.execute(f"""
+                    SELECT p.id, p.user_email, p.platform, substr(p.content, 1, 120), p.schedule_time, p.reminder_minutes
+                    FROM scheduled_posts p
+                    WHERE p.content LIKE '%' || ? || '%' {user_clause}
+                    ORDER BY p.schedule_at
+                    LIMIT ?
+                """, [text, *([user_email] if user_email else []), limit]).fetchall()
+        logger.debug(f"Search returned {len(posts)} posts")
+        return posts
+    except sqlite3.Error as e:
+        logger.error(f"Database error searching scheduled posts: {e}")
+        st.error(f"Database error searching scheduled posts: {e}")
+        mark_uncacheable()
+        return []
+
+@metrics.timed()
+def get_post_content(post_id):
+    logger.info(f"Fetching content for post ID: {post_id}")
+    try:
+        with transaction() as conn:
+            row = conn.execute("SELECT content FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Database error fetching post content: {e}")
+        st.error(f"Database error fetching post content: {e}")
+        return None
+
+@metrics.timed()
 def delete_scheduled_post(post_id):
     logger.info(f"Deleting scheduled post with ID: {post_id}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM scheduled_posts WHERE id = ?", (post_id,))
-        conn.commit()
+        with transaction(write=True) as conn:
+            row = conn.execute("SELECT user_email FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+            conn.execute("DELETE FROM scheduled_posts WHERE id = ?", (post_id,))
+        if row:
+            invalidate("posts", f"posts:{row[0]}")
         logger.debug(f"Scheduled post {post_id} deleted successfully")
     except sqlite3.Error as e:
         logger.error(f"Database error deleting scheduled post: {e}")
         st.error(f"Database error deleting scheduled post: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
\ No newline at end of file
+
+@metrics.timed()
+def delete_posts_bulk(post_ids, user_email: str = None) -> int:
+    """
+    Delete many scheduled posts in a single write transaction.
+    When user_email is given, only that user's posts are deleted.
+    Returns the number of posts deleted.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return 0
+    logger.info(f"Bulk deleting {len(post_ids)} scheduled posts (user: {user_email})")
+    try:
+        with transaction(write=True) as conn:
+            if user_email:
+                owners = {user_email}
+                cursor = conn.executemany(
+                    "DELETE FROM scheduled_posts WHERE id = ? AND user_email = ?",
+                    [(post_id, user_email) for post_id in post_ids]
+                )
+            else:
+                # Collect owners for cache invalidation, staying under SQLite's bound-parameter limit
+                owners = set()
+                for start in range(0, len(post_ids), 500):
+                    chunk = post_ids[start:start + 500]
+                    owners.update(row[0] for row in conn.execute(
+                        f"SELECT DISTINCT user_email FROM scheduled_posts WHERE id IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ))
+                cursor = conn.executemany("DELETE FROM scheduled_posts WHERE id = ?", [(post_id,) for post_id in post_ids])
+        invalidate("posts", *(f"posts:{owner}" for owner in owners))
+        logger.debug(f"Bulk deleted {cursor.rowcount} scheduled posts")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error bulk deleting scheduled posts: {e}")
+        st.error(f"Database error bulk deleting scheduled posts: {e}")
+        return 0
+
+@metrics.timed()
+def get_expired_posts(cutoffs: dict, default_cutoff, after=(0, 0), limit: int = 1000) -> list[dict]:
+    """
+    Next batch of posts past retention, in (schedule_at, id) order after the `after` key.
+    cutoffs maps role -> UTC epoch before which that role's posts expire (None keeps them);
+    posts of users with another role, or no account, use default_cutoff. Posts held by
+    retain_until are skipped. Returns full rows as column -> value dicts.
+    """
+    now = int(time.time())
+    roles = [role for role in cutoffs]
+    case = f"CASE u.role {' '.join('WHEN ? THEN ?' for _ in roles)} ELSE ? END" if roles else "?"
+    bounds = [cutoff for cutoff in list(cutoffs.values()) + [default_cutoff] if cutoff is not None]
+    if not bounds:
+        return []
+    try:
+        with transaction() as conn:
+            cursor = conn.execute(f"""
+                SELECT p.* FROM scheduled_posts p LEFT JOIN users u ON u.email = p.user_email
+                WHERE p.schedule_at < ? AND (p.schedule_at, p.id) > (?, ?)
+                AND (p.retain_until IS NULL OR p.retain_until <= ?)
+                AND p.schedule_at < {case}
+                ORDER BY p.schedule_at, p.id
+                LIMIT ?
+            """, (max(bounds), after[0], after[1], now,
+                  *[value for role in roles for value in (role, cutoffs[role])], default_cutoff, limit))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Database error reading expired posts: {e}")
+        st.error(f"Database error reading expired posts: {e}")
+        return []
+
+@metrics.timed()
+def delete_archived_posts(posts) -> int:
+    """Delete posts (rows from get_expired_posts) once they are archived. Returns the number deleted."""
+    if not posts:
+        return 0
+    try:
+        with transaction(write=True) as conn:
+            # retain_until is re-checked so a post restored since it was read stays put
+            cursor = conn.executemany(
+                "DELETE FROM scheduled_posts WHERE id = ? AND (retain_until IS NULL OR retain_until <= ?)",
+                [(post["id"], int(time.time())) for post in posts]
+            )
+        invalidate("posts", *{f"posts:{post['user_email']}" for post in posts})
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting archived posts: {e}")
+        st.error(f"Database error deleting archived posts: {e}")
+        return 0
+
+@metrics.timed()
+def restore_posts(posts, retain_until: int) -> int:
+    """
+    Re-insert archived posts with their original ids, held in the hot table until retain_until.
+    Posts still (or already) present are left as they are. Returns the number restored.
+    """
+    if not posts:
+        return 0
+    logger.info(f"Restoring {len(posts)} archived posts")
+    try:
+        with transaction(write=True) as conn:
+            table_columns = [row[1] for row in conn.execute("PRAGMA table_info(scheduled_posts)")]
+            # Older segments may lack columns added since; those take their defaults
+            columns = [column for column in table_columns if column in posts[0] and column != "retain_until"]
+            cursor = conn.executemany(
+                f"INSERT OR IGNORE INTO scheduled_posts ({', '.join(columns)}, retain_until)"
+                f" VALUES ({', '.join('?' * len(columns))}, ?)",
+                [[post.get(column) for column in columns] + [retain_until] for post in posts]
+            )
+        invalidate("posts", *{f"posts:{post['user_email']}" for post in posts})
+        logger.debug(f"Restored {cursor.rowcount} archived posts")
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error restoring archived posts: {e}")
+        st.error(f"Database error restoring archived posts: {e}")
+        return 0
+
+@metrics.timed()
+def prune_outbox(before: int) -> int:
+    """Delete sent and failed outbox rows created before `before` (UTC epoch). Returns the number deleted."""
+    try:
+        with transaction(write=True) as conn:
+            return conn.execute(
+                "DELETE FROM reminder_outbox WHERE state IN ('sent', 'failed') AND created_at < ?", (before,)
+            ).rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error pruning the reminder outbox: {e}")
+        st.error(f"Database error pruning the reminder outbox: {e}")
+        return 0
+
+@metrics.timed()
+def incremental_vacuum(max_pages: int = 0) -> int:
+    """
+    Return free pages to the filesystem (all of them when max_pages is 0) and truncate the WAL.
+    Returns the number of pages freed, or -1 when the database is not in incremental
+    auto_vacuum mode (see convert_to_incremental_vacuum).
+    """
+    try:
+        # The sqlite3 module steps this pragma only once (one page) under execute();
+        # executescript runs it to completion, as its own transaction
+        with get_pool()._write_lock, transaction() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return -1
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            freed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return freed
+    except sqlite3.Error as e:
+        logger.error(f"Database error running incremental vacuum: {e}")
+        st.error(f"Database error running incremental vacuum: {e}")
+        return 0
+
+def convert_to_incremental_vacuum():
+    """
+    Switch an existing database to incremental auto_vacuum. This needs a full VACUUM,
+    which rewrites the whole file and blocks writers while it runs: a one-off, offline step.
+    """
+    logger.info("Converting database to incremental auto_vacuum (full VACUUM)")
+    with get_pool()._write_lock, transaction() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
@@ -0,0 +1,152 @@
+"""
+Content-addressed cache of Gemini responses, stored in SQLite.
+
+Entries are keyed on a hash of the model name, generation params and the
+fully rendered prompt, expire after a TTL, and are evicted least recently
+used first once the entry or byte limits are exceeded. A hit does not write:
+access times are collected in memory and written in one batch at most every
+GENERATION_CACHE_ACCESS_FLUSH_SECONDS, or before an eviction needs them. A
+cache failure is never fatal: it is logged and treated as a miss.
+
+Every function here blocks on SQLite; api.py calls them through asyncio.to_thread.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from db import transaction
+from config import (GENERATION_CACHE_TTL_SECONDS, GENERATION_CACHE_MAX_ENTRIES, GENERATION_CACHE_MAX_BYTES,
+                    GENERATION_CACHE_ACCESS_FLUSH_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_accessed = {}  # key -> last hit time, not yet written
+_accessed_lock = threading.Lock()
+_last_flush = time.time()
+
+def _count(counter: str, n: int = 1):
+    with _stats_lock:
+        _stats[counter] += n
+
+def cache_key(prompt: str, model_name: str, params: dict = None) -> str:
+    payload = json.dumps({"model": model_name, "params": params or {}, "prompt": prompt}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get(key: str, record: bool = True):
+    """Return the cached response for key, or None if absent or expired. record=False leaves counters and LRU order alone."""
+    now = time.time()
+    try:
+        with transaction() as conn:
+            row = conn.execute(
+                "SELECT response FROM generation_cache WHERE key = ? AND created_at > ?",
+                (key, now - GENERATION_CACHE_TTL_SECONDS)
+            ).fetchone()
+        if row is None:
+            if record:
+                _count("misses")
+            return None
+        if record:
+            _count("hits")
+            _touch(key, now)
+        return row[0]
+    except sqlite3.Error as e:
+        logger.warning(f"Generation cache lookup failed: {e}")
+        if record:
+            _count("misses")
+        return None
+
+def _touch(key: str, now: float):
+    global _last_flush
+    with _accessed_lock:
+        _accessed[key] = now
+        due = now - _last_flush >= GENERATION_CACHE_ACCESS_FLUSH_SECONDS
+        if due:
+            _last_flush = now
+    if due:
+        try:
+            with transaction(write=True) as conn:
+                _flush_accessed(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Generation cache access time update failed: {e}")
+
+def _flush_accessed(conn):
+    """Write the pending access times inside the caller's write transaction."""
+    with _accessed_lock:
+        pending = list(_accessed.items())
+        _accessed.clear()
+    if pending:
+        conn.executemany("UPDATE generation_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                         [(accessed_at, key) for key, accessed_at in pending])
+
+def put(key: str, model_name: str, response: str):
+    now = time.time()
+    size = len(response.encode("utf-8"))
+    try:
+        with transaction(write=True) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generation_cache (key, model, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size, now, now)
+            )
+            # Eviction walks LRU order, so bring access times up to date first
+            _flush_accessed(conn)
+            evicted = _evict(conn, now)
+        _count("stores")
+        if evicted:
+            _count("evictions", evicted)
+            logger.debug(f"Evicted {evicted} generation cache entries")
+    except sqlite3.Error as e:
+        logger.warning(f"Generation cache store failed: {e}")
+
+def _evict(conn, now: float) -> int:
+    evicted = conn.execute(
+        "DELETE FROM generation_cache WHERE created_at <= ?", (now - GENERATION_CACHE_TTL_SECONDS,)
+    ).rowcount
+    entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generation_cache").fetchone()
+    if entries <= GENERATION_CACHE_MAX_ENTRIES and total_bytes <= GENERATION_CACHE_MAX_BYTES:
+        return evicted
+    # Walk entries from least recently used until both limits are met
+    excess_entries = entries - GENERATION_CACHE_MAX_ENTRIES
+    excess_bytes = total_bytes - GENERATION_CACHE_MAX_BYTES
+    doomed = []
+    for key, size in conn.execute("SELECT key, size FROM generation_cache ORDER BY accessed_at"):
+        if excess_entries <= 0 and excess_bytes <= 0:
+            break
+        doomed.append((key,))
+        excess_entries -= 1
+        excess_bytes -= size
+    conn.executemany("DELETE FROM generation_cache WHERE key = ?", doomed)
+    return evicted + len(doomed)
+
+def delete(key: str):
+    try:
+        with transaction(write=True) as conn:
+            conn.execute("DELETE FROM generation_cache WHERE key = ?", (key,))
+    except sqlite3.Error as e:
+        logger.warning(f"Generation cache delete failed: {e}")
+
+def clear():
+    try:
+        with transaction(write=True) as conn:
+            conn.execute("DELETE FROM generation_cache")
+        logger.info("Generation cache cleared")
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to clear generation cache: {e}")
+
+def cache_stats() -> dict:
+    """Process-local hit/miss counters plus the current size of the shared cache."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    try:
+        with transaction() as conn:
+            stats["entries"], stats["bytes"] = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generation_cache"
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to read generation cache size: {e}")
+    return stats
@@ -1,38 +1,88 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import threading
 
-def setup_logging():
-    # Create logs directory
-    os.makedirs("logs", exist_ok=True)
-
-    # Configure logging
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-
-    # Create rotating file handler (max 5MB, keep 3 backups)
-    file_handler = RotatingFileHandler(
-        "logs/app.log",
-        maxBytes=5 * 1024 * 1024,  # 5MB
-        backupCount=3
-    )
-    file_handler.setLevel(logging.DEBUG)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
+
+_listener = None
+_setup_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
 
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
 
-    # Create formatter
-    formatter = logging.Formatter(
+def _formatter():
+    if LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+def setup_logging():
+    """
+    Route the root logger through a QueueHandler to a background QueueListener
+    that owns the file and console handlers. Safe to call on every Streamlit
+    rerun: only the first call in a process installs anything.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = getattr(logging, LOG_LEVEL, logging.INFO)
+        log_dir = os.path.dirname(LOG_FILE)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+        # Create rotating file handler (max 5MB, keep 3 backups)
+        file_handler = RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=5 * 1024 * 1024,  # 5MB
+            backupCount=3
+        )
+        console_handler = logging.StreamHandler()
+        formatter = _formatter()
+        for handler in (file_handler, console_handler):
+            handler.setLevel(level)
+            handler.setFormatter(formatter)
+
+        # Request threads only enqueue records; formatting and I/O happen on the listener thread
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(level)
+        for handler in list(root.handlers):
+            # Drop handlers left over from earlier setups (e.g. a module reload)
+            root.removeHandler(handler)
+        root.addHandler(QueueHandler(log_queue))
+        root.propagate = False
+
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
 
-    # Prevent duplicate logging
-    logger.propagate = False
\ No newline at end of file
+def shutdown_logging():
+    """Flush queued records and stop the background writer."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
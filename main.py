@@ -1,13 +1,25 @@
+import sys
+import time
+_cold_start = "ui" not in sys.modules
+_imports_started = time.perf_counter()
 import streamlit as st
 from logger import setup_logging
+import metrics
 from db import init_db
 from ui import login_register, render_main_ui
 import logging
 
-# Setup logging
+# Setup logging and metrics export (both are no-ops after the first run in a process)
 setup_logging()
+metrics.start_exporter()
 logger = logging.getLogger(__name__)
 
+if _cold_start:
+    # Streamlit re-executes this script on every rerun; only the first run in a process imports anything
+    _import_seconds = time.perf_counter() - _imports_started
+    metrics.observe("startup.imports", _import_seconds)
+    logger.info(f"Cold start: app imports took {_import_seconds * 1000:.0f}ms")
+
 def main():
     logger.info("Starting post_muse application")
     
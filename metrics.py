@@ -0,0 +1,222 @@
+"""
+In-process latency metrics for the DB, Gemini and UI hot paths.
+
+Each operation gets a histogram: cumulative Prometheus buckets plus a ring of
+recent samples for p50/p95/p99. Operations are timed with @timed or
+metrics.timer(); code that swallows its own failures (db.py returns defaults on
+sqlite3.Error, api.py returns "" after the last retry) calls mark_error() so the
+enclosing timer still counts an error. The snapshot is exposed in the admin
+panel and as Prometheus text over HTTP (METRICS_PORT) or a file (METRICS_FILE).
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from config import (
+    METRICS_SAMPLE_RATE, METRICS_RESERVOIR_SIZE, METRICS_PORT, METRICS_FILE, METRICS_FILE_INTERVAL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached SQLite read up to a slow Gemini call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_current = contextvars.ContextVar("metrics_current", default=None)  # error flag of the innermost timer
+_exporter_started = False
+
+class Histogram:
+    __slots__ = ("count", "errors", "sum", "buckets", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = deque(maxlen=METRICS_RESERVOIR_SIZE)
+
+    def observe(self, seconds: float, error: bool):
+        self.count += 1
+        self.errors += error
+        self.sum += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+def observe(name: str, seconds: float, error: bool = False):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds, error)
+
+def _sampled() -> bool:
+    return METRICS_SAMPLE_RATE >= 1 or random.random() < METRICS_SAMPLE_RATE
+
+def mark_error():
+    """Count the innermost running timer as failed without raising."""
+    flag = _current.get()
+    if flag is not None:
+        flag[0] = True
+
+@contextmanager
+def timer(name: str):
+    """Time the block as one observation of name; exceptions count as errors and propagate."""
+    if not _sampled():
+        yield
+        return
+    flag = [False]
+    token = _current.set(flag)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        # BaseException (st.stop/st.rerun control flow) is not a failure
+        flag[0] = True
+        raise
+    finally:
+        _current.reset(token)
+        observe(name, time.perf_counter() - start, flag[0])
+
+def timed(name: str = None):
+    """Decorator form of timer() for plain and async functions; defaults to module.function."""
+    def decorator(fn):
+        if METRICS_SAMPLE_RATE <= 0:
+            return fn
+        label = name or f"{fn.__module__}.{fn.__name__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def snapshot() -> list[dict]:
+    """Per-operation counts, errors and latency percentiles in milliseconds, sorted by name."""
+    with _lock:
+        items = [(name, h.count, h.errors, h.sum, sorted(h.samples)) for name, h in _histograms.items()]
+    return [
+        {
+            "operation": name,
+            "count": count,
+            "errors": errors,
+            "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+        }
+        for name, count, errors, total, ordered in sorted(items)
+    ]
+
+def percentile(name: str, q: float, min_samples: int = 1):
+    """q-quantile in seconds of name's recent samples, or None while it has fewer than min_samples."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None or len(histogram.samples) < min_samples:
+            return None
+        ordered = sorted(histogram.samples)
+    return _percentile(ordered, q)
+
+def prometheus_text() -> str:
+    """Render every histogram in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted((name, h.count, h.errors, h.sum, list(h.buckets)) for name, h in _histograms.items())
+    lines = [
+        "# HELP postmuse_operation_duration_seconds Latency of instrumented operations.",
+        "# TYPE postmuse_operation_duration_seconds histogram",
+    ]
+    for name, count, _, total, buckets in items:
+        cumulative = 0
+        for bound, hits in zip(BUCKETS, buckets):
+            cumulative += hits
+            lines.append(f'postmuse_operation_duration_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'postmuse_operation_duration_seconds_bucket{{operation="{name}",le="+Inf"}} {count}')
+        lines.append(f'postmuse_operation_duration_seconds_sum{{operation="{name}"}} {total}')
+        lines.append(f'postmuse_operation_duration_seconds_count{{operation="{name}"}} {count}')
+    lines.append("# HELP postmuse_operation_errors_total Failed instrumented operations.")
+    lines.append("# TYPE postmuse_operation_errors_total counter")
+    for name, _, errors, _, _ in items:
+        lines.append(f'postmuse_operation_errors_total{{operation="{name}"}} {errors}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    # Write then rename so a scraper never reads a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+def _metrics_server(port: int):
+    # http.server pulls in the email package; only import it when the endpoint is enabled
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Metrics request: {format % args}")
+
+    return ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+
+def _write_periodically(path: str, interval: int):
+    while True:
+        try:
+            write_prometheus(path)
+        except OSError as e:
+            logger.error(f"Failed to write metrics file {path}: {e}")
+        time.sleep(interval)
+
+def start_exporter(port: int = METRICS_PORT, path: str = METRICS_FILE):
+    """Start the HTTP and/or file exporters once per process; a no-op when neither is configured."""
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if port:
+        try:
+            server = _metrics_server(port)
+        except OSError as e:
+            logger.error(f"Cannot serve metrics on port {port}: {e}")
+        else:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on port {port}")
+    if path:
+        threading.Thread(
+            target=_write_periodically, args=(path, METRICS_FILE_INTERVAL_SECONDS), name="metrics-file", daemon=True
+        ).start()
+        logger.info(f"Writing Prometheus metrics to {path} every {METRICS_FILE_INTERVAL_SECONDS}s")
@@ -0,0 +1,252 @@
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from timeutils import to_epoch
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+def _create_base_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            api_calls INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scheduled_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            content TEXT NOT NULL,
+            schedule_time TEXT NOT NULL,
+            reminder_minutes INTEGER NOT NULL DEFAULT 60,
+            reminder_sent BOOLEAN NOT NULL DEFAULT 0
+        )
+    """)
+
+def _add_reminder_columns(conn):
+    # Databases created before reminders existed lack these columns
+    columns = _columns(conn, "scheduled_posts")
+    if "reminder_minutes" not in columns:
+        conn.execute("ALTER TABLE scheduled_posts ADD COLUMN reminder_minutes INTEGER NOT NULL DEFAULT 60")
+    if "reminder_sent" not in columns:
+        conn.execute("ALTER TABLE scheduled_posts ADD COLUMN reminder_sent BOOLEAN NOT NULL DEFAULT 0")
+
+def _add_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_posts_user_time ON scheduled_posts(user_email, schedule_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_posts_reminder_time ON scheduled_posts(reminder_sent, schedule_time)")
+
+def _add_reminder_due_columns(conn):
+    # Precomputed UTC epochs so the reminder scan is an index range scan
+    # instead of evaluating datetime() over every unsent row.
+    columns = _columns(conn, "scheduled_posts")
+    if "schedule_at" not in columns:
+        conn.execute("ALTER TABLE scheduled_posts ADD COLUMN schedule_at INTEGER")
+    if "remind_at" not in columns:
+        conn.execute("ALTER TABLE scheduled_posts ADD COLUMN remind_at INTEGER")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, schedule_time, reminder_minutes FROM scheduled_posts WHERE id > ? AND schedule_at IS NULL ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = []
+        for post_id, schedule_time, reminder_minutes in rows:
+            try:
+                schedule_at = to_epoch(schedule_time)
+            except ValueError:
+                logger.warning(f"Cannot parse schedule_time {schedule_time!r} for post {post_id}; leaving unindexed")
+                continue
+            updates.append((schedule_at, schedule_at - reminder_minutes * 60, post_id))
+        conn.executemany("UPDATE scheduled_posts SET schedule_at = ?, remind_at = ? WHERE id = ?", updates)
+    conn.execute("DROP INDEX IF EXISTS idx_scheduled_posts_reminder_time")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_posts_due_reminders ON scheduled_posts(remind_at) WHERE reminder_sent = 0")
+
+def _create_generation_cache(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS generation_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_cache_accessed ON generation_cache(accessed_at)")
+
+def _add_quota_bucket_columns(conn):
+    # Token bucket state; NULL means a full bucket
+    columns = _columns(conn, "users")
+    if "quota_tokens" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN quota_tokens REAL")
+    if "quota_updated_at" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN quota_updated_at REAL")
+
+def _add_schedule_at_indexes(conn):
+    # Keyset pagination orders by (schedule_at, id); the user index now sorts by the UTC epoch
+    conn.execute("DROP INDEX IF EXISTS idx_scheduled_posts_user_time")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_posts_user_schedule_at ON scheduled_posts(user_email, schedule_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_posts_schedule_at ON scheduled_posts(schedule_at)")
+
+def ensure_search_index(conn) -> bool:
+    """
+    Create the FTS5 index over scheduled posts if it is missing. This is migration 9, and it runs
+    again after every migration pass, so a database migrated on a SQLite without FTS5 gets its index
+    once FTS5 is available. Returns whether the index exists.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'scheduled_posts_fts'").fetchone():
+        return True
+    # Each post is indexed with its owner as one extra token, 'u' || hex(user_email) (see
+    # db._owner_token), so a per-user search narrows to that user's posts inside the index instead
+    # of ranking every user's matches first. The view is the external content table FTS5 reads back.
+    conn.execute("""
+        CREATE VIEW IF NOT EXISTS scheduled_posts_search AS
+        SELECT id, content, 'u' || hex(user_email) AS owner FROM scheduled_posts
+    """)
+    try:
+        # Prefix indexes let the last search term (a prefix, capped at search.PREFIX_CHARS) be looked up
+        # instead of FTS5 merging the doclists of every word that starts with it
+        conn.execute("""
+            CREATE VIRTUAL TABLE scheduled_posts_fts
+            USING fts5(content, owner, content='scheduled_posts_search', content_rowid='id', prefix='2 3 4 5 6')
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search falls back to LIKE scans until it is available
+        logger.warning(f"Full-text search unavailable: {e}")
+        return False
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS scheduled_posts_fts_insert AFTER INSERT ON scheduled_posts BEGIN
+            INSERT INTO scheduled_posts_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || hex(new.user_email));
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS scheduled_posts_fts_delete AFTER DELETE ON scheduled_posts BEGIN
+            INSERT INTO scheduled_posts_fts(scheduled_posts_fts, rowid, content, owner)
+            VALUES ('delete', old.id, old.content, 'u' || hex(old.user_email));
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS scheduled_posts_fts_update AFTER UPDATE OF content, user_email ON scheduled_posts BEGIN
+            INSERT INTO scheduled_posts_fts(scheduled_posts_fts, rowid, content, owner)
+            VALUES ('delete', old.id, old.content, 'u' || hex(old.user_email));
+            INSERT INTO scheduled_posts_fts(rowid, content, owner) VALUES (new.id, new.content, 'u' || hex(new.user_email));
+        END
+    """)
+    conn.execute("INSERT INTO scheduled_posts_fts(scheduled_posts_fts) VALUES ('rebuild')")
+    logger.info("Built the scheduled posts search index")
+    return True
+
+def _create_reminder_outbox(conn):
+    # One row per reminder email. post_id is UNIQUE so a post can only ever be enqueued once;
+    # delivery state, attempts and the retry schedule live here instead of on scheduled_posts.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL UNIQUE,
+            recipient TEXT NOT NULL,
+            body TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            claimed_by TEXT,
+            claim_expires INTEGER,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            sent_at INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminder_outbox_pending ON reminder_outbox(next_attempt_at) WHERE state = 'pending'")
+
+def _add_retention_hold_column(conn):
+    # Posts restored from the archive are kept in the hot table until retain_until (UTC epoch)
+    if "retain_until" not in _columns(conn, "scheduled_posts"):
+        conn.execute("ALTER TABLE scheduled_posts ADD COLUMN retain_until INTEGER")
+
+def _create_draft_tables(conn):
+    # One batch per generation; every edit of a draft adds a version, the highest being current
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS draft_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            prompt_vars TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_draft_batches_user ON draft_batches(user_email, id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS drafts (
+            batch_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (batch_id, platform, position, version)
+        ) WITHOUT ROWID
+    """)
+
+def _add_outbox_html_body(conn):
+    # HTML alternative for the reminder email; rows enqueued before this stay text-only
+    if "html_body" not in _columns(conn, "reminder_outbox"):
+        conn.execute("ALTER TABLE reminder_outbox ADD COLUMN html_body TEXT")
+
+# (version, description, apply function). Append only: never edit or reorder
+# a migration that has shipped.
+MIGRATIONS = [
+    (1, "create users and scheduled_posts tables", _create_base_tables),
+    (2, "add reminder columns to scheduled_posts", _add_reminder_columns),
+    (3, "add scheduled_posts lookup indexes", _add_indexes),
+    (4, "add precomputed schedule_at/remind_at with partial due-reminder index", _add_reminder_due_columns),
+    # 5 (reminder lease columns on scheduled_posts) was retired before release; reminder_outbox leases instead
+    (6, "create generation_cache table", _create_generation_cache),
+    (7, "add token bucket columns to users", _add_quota_bucket_columns),
+    (8, "index scheduled_posts by schedule_at for keyset pagination", _add_schedule_at_indexes),
+    (9, "add FTS5 index over scheduled post content and owner", ensure_search_index),
+    (10, "create reminder_outbox table", _create_reminder_outbox),
+    (11, "add retain_until hold column for restored posts", _add_retention_hold_column),
+    (12, "create draft_batches and drafts tables", _create_draft_tables),
+    (13, "add html_body to reminder_outbox", _add_outbox_html_body),
+]
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def current_version(conn) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn) -> int:
+    """
+    Apply every pending migration on conn, which must be inside a write transaction.
+    Returns the schema version after migrating.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    version = current_version(conn)
+    for target, description, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Applying schema migration {target}: {description}")
+        migrate(conn)
+        conn.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (target, description, datetime.now(timezone.utc).isoformat())
+        )
+        version = target
+    ensure_search_index(conn)
+    return version
@@ -0,0 +1,99 @@
+"""
+Model backends for api.py: the Gemini client, or an offline fake for load tests.
+
+MODEL_BACKEND=fake swaps in FakeModel. It needs no API key or network access
+and mimics the part of GenerativeModel that api.py uses,
+generate_content_async(), including:
+- log-normal latency
+- a configurable rate of the retryable errors Gemini raises
+- numbered-draft or JSON-mode responses
+- chunked streaming
+"""
+import asyncio
+import json
+import logging
+import random
+from config import (MODEL_BACKEND, GEMINI_MODEL_NAME, GEMINI_GENERATION_CONFIG, FAKE_MODEL_LATENCY_MS,
+                    FAKE_MODEL_LATENCY_SIGMA, FAKE_MODEL_ERROR_RATE, FAKE_MODEL_DRAFT_WORDS, FAKE_MODEL_SEED)
+
+logger = logging.getLogger(__name__)
+
+FAKE_WORDS = ("launch", "today", "team", "growth", "ideas", "build", "customers", "learn", "ship", "story",
+              "product", "thanks", "community", "feature", "insight", "weekly", "better", "faster", "simple", "🚀")
+STREAM_CHUNK_CHARS = 40
+
+def model_name(name: str = None) -> str:
+    """Model name recorded in the generation cache, so fake responses never answer real requests."""
+    name = name or GEMINI_MODEL_NAME
+    return name if MODEL_BACKEND == "gemini" else f"{MODEL_BACKEND}:{name}"
+
+def create_model(api_key: str = None, name: str = None):
+    """Client for the named Gemini model (GEMINI_MODEL_NAME by default)."""
+    if MODEL_BACKEND == "fake":
+        logger.info(f"Using the offline fake model backend for {name or GEMINI_MODEL_NAME}")
+        return FakeModel()
+    if MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown MODEL_BACKEND {MODEL_BACKEND!r}")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable is not set")
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(name or GEMINI_MODEL_NAME, generation_config=GEMINI_GENERATION_CONFIG)
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeStream:
+    """Async iterator over response chunks, spreading the remaining latency across them."""
+
+    def __init__(self, text: str, delay: float):
+        self._chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        self._delay = delay / max(1, len(self._chunks))
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+class FakeModel:
+    def __init__(self, latency_ms: float = FAKE_MODEL_LATENCY_MS, latency_sigma: float = FAKE_MODEL_LATENCY_SIGMA,
+                 error_rate: float = FAKE_MODEL_ERROR_RATE, draft_words: int = FAKE_MODEL_DRAFT_WORDS,
+                 seed=FAKE_MODEL_SEED):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.draft_words = draft_words
+        self._random = random.Random(seed)
+
+    def _latency(self) -> float:
+        return self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000 if self.latency_sigma else self.latency_ms / 1000
+
+    def _draft(self) -> str:
+        return " ".join(self._random.choice(FAKE_WORDS) for _ in range(self.draft_words))
+
+    def _text(self, generation_config: dict) -> str:
+        config = generation_config or {}
+        if config.get("response_mime_type") == "application/json":
+            # JSON mode: one array of drafts per property in the requested schema
+            properties = config.get("response_schema", {}).get("properties", {})
+            return json.dumps({name: [self._draft() for _ in range(3)] for name in properties})
+        return "\n\n".join(f"{i}. {self._draft()}" for i in range(1, 4))
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None, stream=False):
+        latency = self._latency()
+        if self._random.random() < self.error_rate:
+            from google.api_core import exceptions as google_exceptions
+            await asyncio.sleep(latency / 4)
+            error = self._random.choice((google_exceptions.ServiceUnavailable, google_exceptions.TooManyRequests))
+            raise error("Fake model error")
+        text = self._text(generation_config)
+        if stream:
+            # Time to first chunk, then the rest of the latency spread over the chunks
+            await asyncio.sleep(latency * 0.3)
+            return FakeStream(text, latency * 0.7)
+        await asyncio.sleep(latency)
+        return FakeResponse(text)
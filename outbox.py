@@ -0,0 +1,269 @@
+"""
+Reminder delivery through the reminder_outbox table.
+
+Due reminders are moved into the outbox in the same transaction that marks the
+post reminder_sent, so each reminder is enqueued exactly once. Delivery then
+leases outbox rows, sends one message per recipient over a small pool of
+persistent SMTP sessions (logged in once, reused across messages) and records
+each result once: sent, retried later with backoff, or failed for good.
+
+Messages carry the markdown template as plain text plus an HTML alternative
+rendered from it. The template is compiled once per process (markdown is
+converted to HTML then, not per message). For local testing any SMTP sink
+works, e.g. `python -m aiosmtpd -n -l localhost:8025` with MAIL_PORT=8025
+MAIL_STARTTLS=0.
+"""
+import html
+import logging
+import os
+import queue
+import re
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import EmailMessage
+import markdown
+import metrics
+from db import enqueue_due_reminders, claim_outbox, complete_outbox, default_worker_id
+from timeutils import IST
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".github", "emails", "reminder_body.md")
+REMINDER_SUBJECT = "Reminder: Your scheduled post is approaching!"
+ENQUEUE_BATCH_SIZE = int(os.getenv("OUTBOX_ENQUEUE_BATCH_SIZE", "500"))
+SEND_BATCH_SIZE = int(os.getenv("OUTBOX_SEND_BATCH_SIZE", "100"))
+LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "60"))
+RETRY_MAX_SECONDS = int(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+SMTP_MAX_CONNECTIONS = int(os.getenv("SMTP_MAX_CONNECTIONS", "4"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+
+class ReminderTemplate:
+    """
+    reminder_body.md split once into literal text and {{field}} slots, as markdown and as HTML
+    converted from it; rendering only joins strings.
+    """
+
+    FIELD = re.compile(r"{{\s*(\w+)\s*}}")
+
+    def __init__(self, text: str):
+        # re.split with one group alternates literal, field, literal, ...
+        self._parts = self.FIELD.split(text)
+        # Fields are filled in after conversion, so post content is escaped rather than rendered as markdown/HTML
+        self._html_parts = self.FIELD.split(markdown.markdown(text))
+
+    @classmethod
+    def from_file(cls, path: str = REMINDER_TEMPLATE_PATH):
+        with open(path, "r") as f:
+            return cls(f.read())
+
+    @staticmethod
+    def _values(platform, content, schedule_time, reminder_minutes) -> dict:
+        # Format schedule_time for display in IST
+        try:
+            sched_time = datetime.fromisoformat(schedule_time).astimezone(IST).strftime("%Y-%m-%d %H:%M:%S %Z")
+        except ValueError:
+            sched_time = schedule_time
+        return {"platform": platform, "reminder_minutes": str(reminder_minutes),
+                "schedule_time": sched_time, "content": content}
+
+    @staticmethod
+    def _fill(parts: list, values: dict) -> str:
+        parts = parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = values.get(parts[i], "{{" + parts[i] + "}}")
+        return "".join(parts)
+
+    def render(self, platform, content, schedule_time, reminder_minutes) -> str:
+        return self._fill(self._parts, self._values(platform, content, schedule_time, reminder_minutes))
+
+    def render_html(self, platform, content, schedule_time, reminder_minutes) -> str:
+        values = self._values(platform, content, schedule_time, reminder_minutes)
+        return self._fill(self._html_parts, {name: html.escape(value) for name, value in values.items()})
+
+def _connection_lost(error: Exception) -> bool:
+    """Whether an error from a send means the SMTP session itself is unusable."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return not isinstance(error, smtplib.SMTPException)  # socket/TLS errors
+
+def _permanent(error: Exception) -> bool:
+    """5xx replies and refused recipients will not succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+class SMTPPool:
+    """
+    Up to max_connections persistent SMTP sessions. A session is logged in once,
+    then returned to the pool after each message; sessions that drop are
+    discarded and reopened on demand.
+    """
+
+    def __init__(self, host: str, port: int, username: str = None, password: str = None,
+                 starttls: bool = True, use_ssl: bool = False,
+                 max_connections: int = SMTP_MAX_CONNECTIONS, timeout: float = SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    @classmethod
+    def from_env(cls):
+        use_ssl = os.getenv("MAIL_USE_SSL", "0") == "1"
+        return cls(
+            os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+            int(os.getenv("MAIL_PORT", "465" if use_ssl else "587")),
+            os.getenv("MAIL_USERNAME"),
+            os.getenv("MAIL_PASSWORD"),
+            starttls=not use_ssl and os.getenv("MAIL_STARTTLS", "1") == "1",
+            use_ssl=use_ssl,
+        )
+
+    def _connect(self):
+        logger.debug(f"Opening SMTP connection to {self.host}:{self.port}")
+        with metrics.timer("smtp.connect"):
+            smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+            smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+            except BaseException:
+                smtp.close()
+                raise
+        return smtp
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            lost = False
+            try:
+                yield smtp
+            except Exception as e:
+                lost = _connection_lost(e)
+                raise
+            finally:
+                if lost:
+                    smtp.close()
+                else:
+                    self._idle.put(smtp)
+
+    def send(self, message: EmailMessage):
+        # A pooled session may have been closed by the server while idle: reconnect once
+        for attempt in range(2):
+            try:
+                with self.connection() as smtp:
+                    smtp.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+class ReminderOutbox:
+    """Enqueues due reminders and delivers the outbox; one instance per worker process."""
+
+    def __init__(self, pool: SMTPPool, template: ReminderTemplate = None, worker_id: str = None,
+                 sender: str = None):
+        self.pool = pool
+        self.template = template or ReminderTemplate.from_file()
+        self.worker_id = worker_id or default_worker_id()
+        self.sender = sender or os.getenv("MAIL_FROM") or pool.username or "reminders@localhost"
+        self._executor = ThreadPoolExecutor(pool.max_connections, thread_name_prefix="outbox")
+
+    @classmethod
+    def from_env(cls, worker_id: str = None):
+        return cls(SMTPPool.from_env(), worker_id=worker_id)
+
+    def enqueue_due(self) -> int:
+        """Move every currently due reminder into the outbox. Returns the number enqueued."""
+        enqueued = 0
+        while True:
+            batch = enqueue_due_reminders(self.template.render, ENQUEUE_BATCH_SIZE, self.template.render_html)
+            enqueued += batch
+            if batch < ENQUEUE_BATCH_SIZE:
+                return enqueued
+
+    def _message(self, recipient: str, body: str, html_body: str = None) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = REMINDER_SUBJECT
+        message["From"] = self.sender
+        message["To"] = recipient
+        message.set_content(body)
+        if html_body:
+            message.add_alternative(html_body, subtype="html")
+        return message
+
+    def _send(self, outbox_id: int, recipient: str, body: str, html_body: str = None):
+        """Returns None on success or the exception that stopped delivery."""
+        try:
+            with metrics.timer("smtp.send"):
+                self.pool.send(self._message(recipient, body, html_body))
+            logger.debug(f"Reminder {outbox_id} sent to {recipient}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to send reminder {outbox_id} to {recipient}: {e}")
+            return e
+
+    def deliver_due(self) -> tuple[int, int]:
+        """Send every outbox message that is due. Returns (sent, failed) counts, retries included in failed."""
+        sent = failed = 0
+        while True:
+            messages = claim_outbox(SEND_BATCH_SIZE, self.worker_id, LEASE_SECONDS, MAX_ATTEMPTS)
+            if not messages:
+                return sent, failed
+            errors = self._executor.map(lambda m: self._send(*m[:4]), messages)
+            sent_ids, failures = [], []
+            for (outbox_id, _, _, _, attempts), error in zip(messages, errors):
+                if error is None:
+                    sent_ids.append(outbox_id)
+                else:
+                    failures.append((outbox_id, attempts, str(error) or type(error).__name__, _permanent(error)))
+            batch_sent, batch_failed = complete_outbox(sent_ids, failures, self.worker_id, MAX_ATTEMPTS,
+                                                       RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+            sent += batch_sent
+            failed += batch_failed
+            if failures and len(failures) == len(messages):
+                # Nothing got through (server down?): leave the rest for the next run
+                return sent, failed
+            if len(messages) < SEND_BATCH_SIZE:
+                return sent, failed
+
+    def run_once(self) -> tuple[int, int, int]:
+        """Enqueue, then deliver, everything due now. Returns (enqueued, sent, failed)."""
+        enqueued = self.enqueue_due()
+        sent, failed = self.deliver_due()
+        logger.info(f"Outbox run: {enqueued} enqueued, {sent} sent, {failed} failed")
+        return enqueued, sent, failed
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.pool.close()
@@ -0,0 +1,61 @@
+"""
+Per-platform generation parameters and draft checks.
+
+PLATFORM_SETTINGS in config.py holds the numbers. This module turns them into
+Gemini generation configs and checks generated drafts against them (length,
+hashtags, how many drafts came back), so api.py can regenerate only the drafts
+that failed instead of the whole batch.
+"""
+import re
+from config import PLATFORM_SETTINGS, REPAIR_PROMPT_TEMPLATE
+
+DRAFT_COUNT = 3
+GENERATION_KEYS = ("max_output_tokens", "temperature", "stop_sequences")
+_NUMBERING = re.compile(r"^\d[\.\)]\s*")
+_HASHTAG = re.compile(r"#\w+")
+
+def generation_config(platform: str) -> dict:
+    """Gemini generation config for one platform's numbered-drafts request."""
+    settings = PLATFORM_SETTINGS.get(platform, {})
+    return {key: settings[key] for key in GENERATION_KEYS if key in settings}
+
+def combined_max_output_tokens(platforms) -> int:
+    # JSON mode writes every platform's drafts in one response, plus the JSON syntax around them
+    return sum(PLATFORM_SETTINGS.get(p, {}).get("max_output_tokens", 1000) for p in platforms) + 200
+
+def draft_text(draft: str) -> str:
+    """The draft as it would be posted, without the "1. " numbering the model adds."""
+    return _NUMBERING.sub("", draft.strip(), count=1)
+
+def draft_problems(platform: str, draft: str, vars: dict) -> list[str]:
+    settings = PLATFORM_SETTINGS.get(platform, {})
+    text = draft_text(draft)
+    if not text:
+        return ["it is empty"]
+    problems = []
+    max_chars = settings.get("max_chars")
+    if max_chars and len(text) > max_chars:
+        problems.append(f"it is {len(text)} characters, over the {max_chars} limit")
+    wanted = {tag.lower() for tag in _HASHTAG.findall(vars.get("hashtags") or "")}
+    if settings.get("require_hashtags") and wanted and not wanted & {t.lower() for t in _HASHTAG.findall(text)}:
+        problems.append(f"it uses none of the hashtags {' '.join(sorted(wanted))}")
+    return problems
+
+def validate_drafts(platform: str, drafts: list[str], vars: dict) -> dict[int, list[str]]:
+    """Problems by draft index; indices past the end of drafts stand for drafts that are missing."""
+    problems = {}
+    for index, draft in enumerate(drafts[:DRAFT_COUNT]):
+        found = draft_problems(platform, draft, vars)
+        if found:
+            problems[index] = found
+    for index in range(len(drafts), DRAFT_COUNT):
+        problems[index] = ["it is missing"]
+    return problems
+
+def repair_prompt(prompt: str, problems: dict[int, list[str]]) -> str:
+    """Targeted prompt asking for just enough drafts to replace the rejected and missing ones."""
+    missing = [i for i, found in problems.items() if found == ["it is missing"]]
+    described = [f"draft {i + 1}: {'; '.join(found)}" for i, found in sorted(problems.items()) if i not in missing]
+    if missing:
+        described.append(f"{len(missing)} draft(s) were missing")
+    return REPAIR_PROMPT_TEMPLATE.format(prompt=prompt, problems="; ".join(described), count=len(problems))
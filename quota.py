@@ -0,0 +1,124 @@
+"""
+Generation quota: a total call limit per role plus a token bucket that caps bursts.
+
+Logged-in users are accounted in the users table. reserve() checks the limit,
+refills and debits the bucket and counts the call in a single UPDATE, so
+parallel tabs or double clicks cannot overshoot; refund() undoes it in one
+statement when generation fails. Anonymous sessions are accounted the same
+way in process memory under a lock.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import streamlit as st
+from db import transaction
+from read_cache import invalidate
+from config import QUOTA_LIMITS, QUOTA_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_ROLE = "anonymous"
+ANONYMOUS_SESSION_TTL_SECONDS = 24 * 3600
+
+_anonymous = {}  # session id -> [calls used, bucket tokens, bucket updated_at]
+_anonymous_lock = threading.Lock()
+
+def limit_for(role: str):
+    """Total generations allowed for role, or None for unlimited."""
+    return QUOTA_LIMITS.get(role, QUOTA_LIMITS["user"])
+
+def _bucket_for(role: str):
+    capacity, refill_seconds = QUOTA_BUCKETS.get(role, QUOTA_BUCKETS["user"])
+    return capacity, 1.0 / refill_seconds
+
+def anonymous_usage(session_id: str) -> int:
+    with _anonymous_lock:
+        state = _anonymous.get(session_id)
+        return state[0] if state else 0
+
+def reserve(subject: str, role: str) -> bool:
+    """
+    Reserve one generation for subject (user email, or session id when role is "anonymous").
+    Returns False when the total limit is reached or the token bucket is empty.
+    """
+    if role == ANONYMOUS_ROLE:
+        return _reserve_anonymous(subject)
+    logger.info(f"Reserving generation quota for user: {subject}")
+    capacity, rate = _bucket_for(role)
+    params = {"email": subject, "limit": limit_for(role), "capacity": capacity, "rate": rate, "now": time.time()}
+    try:
+        with transaction(write=True) as conn:
+            cursor = conn.execute("""
+                UPDATE users SET
+                    api_calls = api_calls + 1,
+                    quota_tokens = MIN(:capacity, COALESCE(quota_tokens, :capacity) + (:now - COALESCE(quota_updated_at, :now)) * :rate) - 1,
+                    quota_updated_at = :now
+                WHERE email = :email
+                AND (:limit IS NULL OR api_calls < :limit)
+                AND MIN(:capacity, COALESCE(quota_tokens, :capacity) + (:now - COALESCE(quota_updated_at, :now)) * :rate) >= 1
+            """, params)
+        reserved = cursor.rowcount == 1
+        if reserved:
+            invalidate("users", f"user:{subject}")
+        logger.debug(f"Quota reservation for {subject}: {'granted' if reserved else 'denied'}")
+        return reserved
+    except sqlite3.Error as e:
+        logger.error(f"Database error reserving quota: {e}")
+        st.error(f"Database error reserving quota: {e}")
+        return False
+
+def commit(subject: str, role: str):
+    """
+    Confirm a reservation. The call was already counted by reserve(), so nothing
+    is written; this exists so callers pair every reserve() with commit() or refund().
+    """
+    logger.debug(f"Quota reservation committed for {subject} ({role})")
+
+def refund(subject: str, role: str):
+    """Give back a reserved generation that produced nothing."""
+    if role == ANONYMOUS_ROLE:
+        _refund_anonymous(subject)
+        return
+    logger.info(f"Refunding generation quota for user: {subject}")
+    capacity, _ = _bucket_for(role)
+    try:
+        with transaction(write=True) as conn:
+            conn.execute(
+                "UPDATE users SET api_calls = MAX(api_calls - 1, 0), quota_tokens = MIN(?, COALESCE(quota_tokens, 0) + 1) WHERE email = ?",
+                (capacity, subject)
+            )
+        invalidate("users", f"user:{subject}")
+    except sqlite3.Error as e:
+        logger.error(f"Database error refunding quota: {e}")
+        st.error(f"Database error refunding quota: {e}")
+
+def _reserve_anonymous(session_id: str) -> bool:
+    capacity, rate = _bucket_for(ANONYMOUS_ROLE)
+    limit = limit_for(ANONYMOUS_ROLE)
+    now = time.time()
+    with _anonymous_lock:
+        _prune_anonymous(now)
+        state = _anonymous.setdefault(session_id, [0, float(capacity), now])
+        tokens = min(capacity, state[1] + (now - state[2]) * rate)
+        if (limit is not None and state[0] >= limit) or tokens < 1:
+            logger.debug(f"Quota reservation for anonymous session {session_id}: denied")
+            return False
+        state[0] += 1
+        state[1] = tokens - 1
+        state[2] = now
+    logger.debug(f"Quota reservation for anonymous session {session_id}: granted")
+    return True
+
+def _refund_anonymous(session_id: str):
+    capacity, _ = _bucket_for(ANONYMOUS_ROLE)
+    with _anonymous_lock:
+        state = _anonymous.get(session_id)
+        if state:
+            state[0] = max(state[0] - 1, 0)
+            state[1] = min(capacity, state[1] + 1)
+
+def _prune_anonymous(now: float):
+    # Called with the lock held; drops sessions idle for a day
+    for session_id in [s for s, state in _anonymous.items() if now - state[2] > ANONYMOUS_SESSION_TTL_SECONDS]:
+        del _anonymous[session_id]
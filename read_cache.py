@@ -0,0 +1,76 @@
+"""
+Process-wide cache for hot read queries, invalidated explicitly by write paths.
+
+Cached values are tagged with topics such as "user:<email>" or "posts". A
+writer calls invalidate() with the topics it touched, which bumps their
+version; entries recorded under an older version are ignored from then on.
+Every Streamlit session in the process shares the cache, so a rerun that
+changes nothing costs no database round trips. The TTL only bounds how
+stale an entry can get when another process writes to the database.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from config import READ_CACHE_TTL_SECONDS, READ_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (function name, args, kwargs) -> (expires_at, topic versions, value)
+_versions = defaultdict(int)
+_local = threading.local()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def cached_read(*topics: str):
+    """
+    Cache a read function's result under the given topics, which are format strings over
+    its arguments, e.g. @cached_read("user:{0}"). Arguments must be hashable.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            entry_topics = tuple(t.format(*args, **kwargs) for t in topics)
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _lock:
+                versions = tuple(_versions[t] for t in entry_topics)
+                entry = _entries.get(key)
+                if entry is not None and entry[0] > now and entry[1] == versions:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return entry[2]
+                _stats["misses"] += 1
+            _local.uncacheable = False
+            value = fn(*args, **kwargs)
+            with _lock:
+                # Skip the store if a writer invalidated these topics while we were reading
+                if not _local.uncacheable and tuple(_versions[t] for t in entry_topics) == versions:
+                    _entries[key] = (now + READ_CACHE_TTL_SECONDS, versions, value)
+                    _entries.move_to_end(key)
+                    while len(_entries) > READ_CACHE_MAX_ENTRIES:
+                        _entries.popitem(last=False)
+            return value
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+def mark_uncacheable():
+    """Called from a cached function's error path so its fallback value is not cached."""
+    _local.uncacheable = True
+
+def invalidate(*topics: str):
+    with _lock:
+        for topic in topics:
+            _versions[topic] += 1
+        _stats["invalidations"] += len(topics)
+    logger.debug(f"Invalidated read cache topics: {topics}")
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def cache_stats() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_entries)}
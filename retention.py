@@ -0,0 +1,161 @@
+"""
+Retention job: keeps scheduled_posts down to live and recent posts.
+
+Posts whose schedule time is older than their owner's role retention
+(RETENTION_DAYS) are moved, in batches, into gzipped JSONL segments under
+ARCHIVE_DIR and deleted from the hot table. Each batch is flushed to disk
+before its rows are deleted, so a crash can at worst archive a row twice,
+never lose it. Sent and failed reminder_outbox rows are pruned the same way,
+then freed pages are handed back with an incremental vacuum. Run it daily
+from cron.
+
+Archived posts can be restored on demand. They return with their original
+ids and are held in the hot table for RESTORE_HOLD_DAYS before they become
+eligible for archiving again.
+
+    python retention.py                                   # archive, prune, vacuum
+    python retention.py --dry-run                         # count what would be archived
+    python retention.py --restore --user alice@example.com --since 2025-01-01
+    python retention.py --restore --ids 12,13
+    python retention.py --convert-vacuum                  # one-off for databases created before auto_vacuum
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from logger import setup_logging
+from config import (RETENTION_DAYS, RETENTION_DAYS_DEFAULT, RETENTION_BATCH_SIZE, ARCHIVE_DIR,
+                    RESTORE_HOLD_DAYS, OUTBOX_RETENTION_DAYS)
+from db import (init_db, get_expired_posts, delete_archived_posts, restore_posts, prune_outbox,
+                incremental_vacuum, convert_to_incremental_vacuum)
+from timeutils import to_epoch
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+SEGMENT_PREFIX = "posts-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+def _cutoff(now: int, days):
+    return None if days is None else now - days * DAY_SECONDS
+
+def _append_segment(path: str, posts):
+    # Each batch is its own gzip member; gzip.open reads concatenated members as one stream
+    with gzip.open(path, "ab") as f:
+        f.write("".join(json.dumps(post, ensure_ascii=False) + "\n" for post in posts).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileobj.fileno())
+
+def archive_expired(now: int = None, batch_size: int = RETENTION_BATCH_SIZE, archive_dir: str = ARCHIVE_DIR,
+                    dry_run: bool = False) -> int:
+    """Move every post past retention into this run's archive segment. Returns the number archived."""
+    now = int(now or time.time())
+    cutoffs = {role: _cutoff(now, days) for role, days in RETENTION_DAYS.items()}
+    default_cutoff = _cutoff(now, RETENTION_DAYS_DEFAULT)
+    segment = os.path.join(
+        archive_dir, f"{SEGMENT_PREFIX}{datetime.fromtimestamp(now, timezone.utc):%Y%m%dT%H%M%S}{SEGMENT_SUFFIX}"
+    )
+    archived = 0
+    after = (0, 0)
+    while True:
+        posts = get_expired_posts(cutoffs, default_cutoff, after, batch_size)
+        if not posts:
+            break
+        after = (posts[-1]["schedule_at"], posts[-1]["id"])
+        if dry_run:
+            archived += len(posts)
+        else:
+            os.makedirs(archive_dir, exist_ok=True)
+            _append_segment(segment, posts)
+            archived += delete_archived_posts(posts)
+            logger.debug(f"Archived a batch of {len(posts)} posts to {segment}")
+        if len(posts) < batch_size:
+            break
+    logger.info(f"{'Would archive' if dry_run else 'Archived'} {archived} expired posts")
+    return archived
+
+def iter_archived(archive_dir: str = ARCHIVE_DIR, user_email: str = None, post_ids=None,
+                  since: int = None, until: int = None):
+    """Yield archived posts matching every given filter (since/until bound schedule_at, UTC epoch)."""
+    if not os.path.isdir(archive_dir):
+        return
+    post_ids = set(post_ids) if post_ids else None
+    for name in sorted(os.listdir(archive_dir)):
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        path = os.path.join(archive_dir, name)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    post = json.loads(line)
+                    if user_email and post["user_email"] != user_email:
+                        continue
+                    if post_ids is not None and post["id"] not in post_ids:
+                        continue
+                    if since is not None and post["schedule_at"] < since:
+                        continue
+                    if until is not None and post["schedule_at"] >= until:
+                        continue
+                    yield post
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            # A run that crashed mid-write leaves a truncated last member; its rows were never deleted
+            logger.warning(f"Stopped reading damaged archive segment {path}: {e}")
+
+def restore(user_email: str = None, post_ids=None, since: int = None, until: int = None,
+            archive_dir: str = ARCHIVE_DIR, hold_days: int = RESTORE_HOLD_DAYS,
+            batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """Put matching archived posts back into scheduled_posts. Returns the number restored."""
+    retain_until = int(time.time()) + hold_days * DAY_SECONDS
+    restored = 0
+    batch = []
+    for post in iter_archived(archive_dir, user_email, post_ids, since, until):
+        batch.append(post)
+        if len(batch) >= batch_size:
+            restored += restore_posts(batch, retain_until)
+            batch = []
+    restored += restore_posts(batch, retain_until)
+    logger.info(f"Restored {restored} archived posts, held until {retain_until}")
+    return restored
+
+def run(dry_run: bool = False) -> dict:
+    """Archive expired posts, prune the outbox and vacuum. Returns counts for logging."""
+    now = int(time.time())
+    result = {"archived": archive_expired(now, dry_run=dry_run)}
+    if not dry_run:
+        result["outbox_pruned"] = prune_outbox(now - OUTBOX_RETENTION_DAYS * DAY_SECONDS)
+        result["pages_freed"] = incremental_vacuum()
+        if result["pages_freed"] < 0:
+            logger.warning("Database is not in incremental auto_vacuum mode; run retention.py --convert-vacuum once")
+    return result
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Archive expired scheduled posts, or restore archived ones.")
+    parser.add_argument("--dry-run", action="store_true", help="count posts past retention without archiving")
+    parser.add_argument("--restore", action="store_true", help="restore archived posts matching the filters")
+    parser.add_argument("--user", help="restore only this user's posts")
+    parser.add_argument("--ids", help="restore only these comma-separated post ids")
+    parser.add_argument("--since", help="restore posts scheduled at or after this ISO date/time (IST if naive)")
+    parser.add_argument("--until", help="restore posts scheduled before this ISO date/time (IST if naive)")
+    parser.add_argument("--convert-vacuum", action="store_true",
+                        help="switch an existing database to incremental auto_vacuum (full VACUUM)")
+    args = parser.parse_args()
+
+    init_db()
+    if args.convert_vacuum:
+        convert_to_incremental_vacuum()
+        return
+    if args.restore:
+        if not (args.user or args.ids or args.since or args.until):
+            parser.error("--restore needs at least one of --user, --ids, --since, --until")
+        post_ids = [int(i) for i in args.ids.split(",")] if args.ids else None
+        restore(args.user, post_ids,
+                to_epoch(args.since) if args.since else None, to_epoch(args.until) if args.until else None)
+        return
+    logger.info(f"Retention run: {run(args.dry_run)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Resident reminder scheduler.
+
+Keeps upcoming reminders in a min-heap keyed on remind_at and sleeps until the
+next one is due, so reminders go out within seconds instead of on the next
+15-minute cron tick. New posts are picked up by polling past the highest post
+id already seen; deleted posts are dropped lazily, because enqueueing a deleted
+post simply finds nothing. Delivery, including retries of failed sends, goes
+through the reminder outbox (see outbox.py).
+
+    python scheduler.py          # run as a daemon
+    python scheduler.py --once   # deliver everything currently due and exit
+"""
+import argparse
+import heapq
+import logging
+import os
+import signal
+import threading
+import time
+from logger import setup_logging
+from db import init_db, get_upcoming_reminders, next_outbox_attempt_at, default_worker_id
+from outbox import ReminderOutbox
+
+logger = logging.getLogger(__name__)
+
+LOOKAHEAD_SECONDS = int(os.getenv("REMINDER_LOOKAHEAD_SECONDS", "900"))
+POLL_SECONDS = int(os.getenv("REMINDER_POLL_SECONDS", "30"))
+
+class ReminderScheduler:
+    """
+    Sleeps until the earliest upcoming reminder or outbox retry, then enqueues
+    and delivers everything that is due. Safe to run alongside other schedulers
+    or the cron script: each reminder is enqueued once and each outbox message
+    is leased by one worker at a time.
+    """
+
+    def __init__(self, outbox: ReminderOutbox = None, worker_id: str = None,
+                 lookahead: int = LOOKAHEAD_SECONDS, poll_interval: int = POLL_SECONDS):
+        self.worker_id = worker_id or default_worker_id()
+        self.outbox = outbox or ReminderOutbox.from_env(self.worker_id)
+        self.lookahead = lookahead
+        self.poll_interval = poll_interval
+        self._heap = []  # (remind_at, post_id)
+        self._queued = set()
+        self._last_id = 0
+        self._horizon = 0
+        self._next_poll = 0
+        self._retry_at = None  # earliest pending outbox retry
+        self._stop = threading.Event()
+
+    def _push(self, reminders):
+        for remind_at, post_id in reminders:
+            if post_id not in self._queued:
+                self._queued.add(post_id)
+                heapq.heappush(self._heap, (remind_at, post_id))
+
+    def refresh(self, full: bool = False):
+        """Reload the lookahead window (full) or just add posts created since the last refresh."""
+        now = int(time.time())
+        if full:
+            self._heap.clear()
+            self._queued.clear()
+            self._horizon = now + self.lookahead
+            reminders, self._last_id = get_upcoming_reminders(self._horizon)
+        else:
+            reminders, self._last_id = get_upcoming_reminders(self._horizon, self._last_id)
+        self._push(reminders)
+        self._next_poll = now + self.poll_interval
+        logger.debug(f"Scheduler heap holds {len(self._heap)} reminders (full refresh: {full})")
+
+    def dispatch_due(self) -> int:
+        """Enqueue every due reminder and deliver the outbox. Returns the number sent."""
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, post_id = heapq.heappop(self._heap)
+            self._queued.discard(post_id)
+        try:
+            _, sent, _ = self.outbox.run_once()
+        except Exception as e:
+            logger.error(f"Reminder delivery failed: {e}")
+            sent = 0
+        # Messages left due (delivery gave up on a dead server) wait for the next poll instead of spinning
+        retry_at = next_outbox_attempt_at()
+        self._retry_at = None if retry_at is None else max(retry_at, now + self.poll_interval)
+        return sent
+
+    def run(self):
+        logger.info(f"Reminder scheduler {self.worker_id} started")
+        self.refresh(full=True)
+        self.dispatch_due()
+        while not self._stop.is_set():
+            now = time.time()
+            if now >= self._horizon - self.poll_interval:
+                self.refresh(full=True)
+            elif now >= self._next_poll:
+                self.refresh()
+            if (self._heap and self._heap[0][0] <= now) or (self._retry_at is not None and self._retry_at <= now):
+                sent = self.dispatch_due()
+                logger.info(f"Delivered {sent} reminders")
+            wake_at = self._next_poll
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            if self._retry_at is not None:
+                wake_at = min(wake_at, self._retry_at)
+            self._stop.wait(max(0, wake_at - time.time()))
+        self.outbox.close()
+        logger.info(f"Reminder scheduler {self.worker_id} stopped")
+
+    def stop(self):
+        self._stop.set()
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Deliver scheduled post reminders.")
+    parser.add_argument("--once", action="store_true", help="deliver reminders that are due now and exit")
+    args = parser.parse_args()
+
+    init_db()
+    scheduler = ReminderScheduler()
+    if args.once:
+        sent = scheduler.dispatch_due()
+        scheduler.outbox.close()
+        logger.info(f"Delivered {sent} reminders")
+        return
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Ranking and snippets for a user's own post search.
+
+bm25() in FTS5 counts every row in the table that contains each query term
+before it ranks anything, so a common word costs a scan of its whole doclist
+on every search, however few posts the user has. db.search_scheduled_posts
+therefore only asks FTS5 for a user's newest matching rowids (index seeks) and
+ranks that bounded candidate set here with BM25, taking term statistics from
+the candidates themselves. The tokenizer approximates FTS5's unicode61 so the
+ranking agrees with what the index matched.
+"""
+import math
+import re
+import unicodedata
+from itertools import repeat
+
+# Longest prefix with its own FTS5 prefix index (prefix='2 3 4 5 6' in migrations.ensure_search_index).
+# A longer last term is searched by this prefix and checked here, so FTS5 never merges a prefix doclist.
+PREFIX_CHARS = 6
+SNIPPET_TOKENS = 16
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[^\W_]+")
+# unicode61 on ASCII text: letters and digits are token characters, everything else separates
+_ASCII_SEPARATORS = bytes(c if chr(c).isalnum() else ord(" ") for c in range(128)) + bytes(range(128, 256))
+
+def fold(text: str) -> str:
+    """Case-fold and strip diacritics, as unicode61 does."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    if decomposed.isascii():
+        return decomposed
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def terms(text: str) -> list[str]:
+    text = fold(text)
+    if text.isascii():
+        # Several times faster than the regex, which matters when ranking hundreds of posts
+        return text.encode("ascii").translate(_ASCII_SEPARATORS).decode("ascii").split()
+    return _TOKEN.findall(text)
+
+def fts_terms(query_terms: list[str]) -> str:
+    """FTS5 expression for the terms: all required, the last one a prefix match capped at PREFIX_CHARS."""
+    quoted = [f'"{term}"' for term in query_terms[:-1]]
+    quoted.append(f'"{query_terms[-1][:PREFIX_CHARS]}"*')
+    return " ".join(quoted)
+
+def _matches(query_terms: list[str], token: str) -> bool:
+    return token in query_terms[:-1] or token.startswith(query_terms[-1])
+
+def rank(query_terms: list[str], candidates: list, content_index: int, limit: int) -> list:
+    """
+    The best `limit` candidates (rows whose content is at content_index), BM25-scored over the
+    candidate set. Candidates come newest first, which also breaks ties. Rows that don't match the
+    full last term (FTS5 only checked its first PREFIX_CHARS characters) are dropped.
+    """
+    documents = []
+    for row in candidates:
+        tokens = terms(row[content_index])
+        counts = [tokens.count(term) for term in query_terms[:-1]]
+        counts.append(sum(map(str.startswith, tokens, repeat(query_terms[-1]))))
+        if all(counts):
+            documents.append((row, counts, len(tokens)))
+    if not documents:
+        return []
+    average_length = sum(length for _, _, length in documents) / len(documents)
+    idf = [
+        math.log(1 + (len(documents) - n + 0.5) / (n + 0.5))
+        for n in (sum(1 for _, counts, _ in documents if counts[i]) for i in range(len(query_terms)))
+    ]
+
+    def score(document):
+        _, counts, length = document
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+        return sum(w * tf * (BM25_K1 + 1) / (tf + norm) for w, tf in zip(idf, counts))
+
+    ranked = sorted(enumerate(documents), key=lambda item: (-score(item[1]), item[0]))
+    return [document[0] for _, document in ranked[:limit]]
+
+def snippet(content: str, query_terms: list[str], size: int = SNIPPET_TOKENS) -> str:
+    """Up to `size` tokens around the first match with matches in bold, like FTS5 snippet()."""
+    tokens = list(_TOKEN.finditer(content))
+    hits = [i for i, match in enumerate(tokens) if _matches(query_terms, fold(match.group()))]
+    if not hits:
+        return content[:120]
+    start = max(0, min(hits[0] - size // 4, len(tokens) - size))
+    window = tokens[start:start + size]
+    parts = ["…" if start else ""]
+    position = window[0].start()
+    for i, match in enumerate(window, start):
+        parts.append(content[position:match.start()])
+        parts.append(f"**{match.group()}**" if i in hits else match.group())
+        position = match.end()
+    parts.append("…" if start + size < len(tokens) else content[position:])
+    return "".join(parts)
@@ -0,0 +1,24 @@
+import pytest
+import db
+import read_cache
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """Point db.py at an empty database file; nothing is migrated yet."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(db, "_db_initialized", False)
+    read_cache.clear()
+    yield str(tmp_path / "users.db")
+    db.close_pool()
+    read_cache.clear()
+
+@pytest.fixture
+def database(empty_db):
+    """A fully migrated database with the default admin account."""
+    db.init_db()
+    return empty_db
+
+def add_user(email: str, role: str = "user"):
+    # Skips bcrypt, which these tests don't exercise
+    with db.transaction(write=True) as conn:
+        conn.execute("INSERT INTO users (email, password, role) VALUES (?, 'x', ?)", (email, role))
@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import datetime
+import db
+from migrations import MIGRATIONS, current_version
+from timeutils import IST
+
+# Schema and data as the app created them before versioned migrations existed
+LEGACY_SCHEMA = """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'user',
+        api_calls INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE scheduled_posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_email TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        content TEXT NOT NULL,
+        schedule_time TEXT NOT NULL,
+        reminder_minutes INTEGER NOT NULL DEFAULT 60,
+        reminder_sent BOOLEAN NOT NULL DEFAULT 0
+    );
+"""
+
+def _legacy_database(path: str, schedule_times):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO users (email, password, role, api_calls) VALUES ('alice@example.com', 'x', 'user', 4)")
+    conn.executemany(
+        "INSERT INTO scheduled_posts (user_email, platform, content, schedule_time, reminder_minutes) VALUES (?, ?, ?, ?, 30)",
+        [("alice@example.com", "twitter", f"legacy launch post {i}", t) for i, t in enumerate(schedule_times)]
+    )
+    conn.commit()
+    conn.close()
+
+def test_fresh_database_reaches_latest_version(database):
+    with db.transaction() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        assert conn.execute("SELECT role FROM users WHERE email = 'admin'").fetchone() == ("admin",)
+        # The UNIQUE autoindex is the only index users needs
+        assert [row[1] for row in conn.execute("PRAGMA index_list(users)")] == ["sqlite_autoindex_users_1"]
+        # Reminder leases live on reminder_outbox only
+        assert not {"claimed_by", "claim_expires"} & {row[1] for row in conn.execute("PRAGMA table_info(scheduled_posts)")}
+
+def test_legacy_database_is_upgraded_in_place(empty_db):
+    when = datetime(2025, 3, 1, 18, 30, tzinfo=IST)
+    _legacy_database(empty_db, [when.isoformat(), "not a date"])
+
+    db.init_db()
+
+    with db.transaction() as conn:
+        assert current_version(conn) == MIGRATIONS[-1][0]
+        rows = conn.execute(
+            "SELECT content, schedule_at, remind_at, reminder_sent FROM scheduled_posts ORDER BY id"
+        ).fetchall()
+        assert conn.execute("SELECT api_calls FROM users WHERE email = 'alice@example.com'").fetchone() == (4,)
+    # Existing rows keep their data and get the UTC epochs backfilled
+    assert rows[0] == ("legacy launch post 0", int(when.timestamp()), int(when.timestamp()) - 30 * 60, 0)
+    # An unparseable time is left unindexed rather than failing the migration
+    assert rows[1][0] == "legacy launch post 1" and rows[1][1] is None
+
+def test_legacy_posts_are_searchable_after_upgrade(empty_db):
+    _legacy_database(empty_db, [datetime(2025, 3, 1, 18, 30, tzinfo=IST).isoformat()])
+    db.init_db()
+    results = db.search_scheduled_posts.uncached("launch", "alice@example.com")
+    assert [post[1] for post in results] == ["alice@example.com"]
+    assert db.search_scheduled_posts.uncached("launch", "bob@example.com") == []
+
+def test_migrations_run_once(database):
+    db.close_pool()
+    db._db_initialized = False
+    db.init_db()
+    with db.transaction() as conn:
+        versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _, _ in MIGRATIONS]
+
+def test_search_index_is_created_once_fts5_is_available(database):
+    # As if migration 9 had run on a SQLite without FTS5
+    with db.transaction(write=True) as conn:
+        for trigger in ("insert", "delete", "update"):
+            conn.execute(f"DROP TRIGGER scheduled_posts_fts_{trigger}")
+        conn.execute("DROP TABLE scheduled_posts_fts")
+        conn.execute(
+            "INSERT INTO scheduled_posts (user_email, platform, content, schedule_time, schedule_at, remind_at)"
+            " VALUES ('alice@example.com', 'twitter', 'launch day', '2025-03-01T18:30:00+05:30', 0, 0)"
+        )
+    db.close_pool()
+    db._db_initialized = False
+    db.init_db()
+    assert len(db.search_scheduled_posts.uncached("launch", "alice@example.com")) == 1
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import pytest
+import db
+from timeutils import IST
+
+def _render(platform, content, schedule_time, reminder_minutes):
+    return f"{platform}: {content}"
+
+def _in_parallel(workers: int, call):
+    barrier = threading.Barrier(workers)
+
+    def run(i):
+        barrier.wait()
+        return call(i)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, range(workers)))
+
+def _outbox(outbox_id: int):
+    with db.transaction() as conn:
+        return conn.execute(
+            "SELECT state, attempts, next_attempt_at, claimed_by, last_error FROM reminder_outbox WHERE id = ?", (outbox_id,)
+        ).fetchone()
+
+@pytest.fixture
+def due_posts(database):
+    """Ten posts due in 30 minutes with an hour's reminder, so every reminder is due now."""
+    schedule_time = datetime.now(IST) + timedelta(minutes=30)
+    for i in range(10):
+        db.schedule_post("alice@example.com", "twitter", f"post {i}", schedule_time, 60)
+    return 10
+
+def test_concurrent_enqueue_creates_one_row_per_post(due_posts):
+    enqueued = _in_parallel(4, lambda _: db.enqueue_due_reminders(_render))
+    assert sum(enqueued) == due_posts
+    with db.transaction() as conn:
+        assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT post_id) FROM reminder_outbox").fetchone() == (due_posts, due_posts)
+        assert conn.execute("SELECT COUNT(*) FROM scheduled_posts WHERE reminder_sent = 0").fetchone()[0] == 0
+
+def test_enqueue_stores_both_bodies(due_posts):
+    db.enqueue_due_reminders(_render, render_html=lambda *args: f"<p>{_render(*args)}</p>")
+    (_, recipient, body, html_body, attempts), *_ = db.claim_outbox(worker_id="w1")
+    assert recipient == "alice@example.com"
+    assert html_body == f"<p>{body}</p>"
+    assert attempts == 1
+
+def test_concurrent_claims_are_disjoint(due_posts):
+    db.enqueue_due_reminders(_render)
+    claims = _in_parallel(2, lambda i: db.claim_outbox(limit=due_posts, worker_id=f"w{i}"))
+    ids = [[row[0] for row in claim] for claim in claims]
+    assert not set(ids[0]) & set(ids[1])
+    assert len(ids[0]) + len(ids[1]) == due_posts
+
+def test_complete_by_non_owner_is_ignored(due_posts):
+    db.enqueue_due_reminders(_render)
+    outbox_id = db.claim_outbox(limit=1, worker_id="w1")[0][0]
+    assert db.complete_outbox([outbox_id], [], worker_id="w2") == (0, 0)
+    assert _outbox(outbox_id)[0] == "pending"
+    assert db.complete_outbox([outbox_id], [], worker_id="w1") == (1, 0)
+    assert db.complete_outbox([outbox_id], [], worker_id="w1") == (0, 0)
+    assert _outbox(outbox_id)[0] == "sent"
+
+def test_expired_lease_is_reclaimed(due_posts):
+    db.enqueue_due_reminders(_render)
+    outbox_id = db.claim_outbox(limit=1, worker_id="w1", lease_seconds=0)[0][0]
+    reclaimed = db.claim_outbox(limit=due_posts, worker_id="w2")
+    assert (outbox_id, 2) in [(row[0], row[4]) for row in reclaimed]
+    # The first worker lost its lease, so its late result is dropped
+    assert db.complete_outbox([outbox_id], [], worker_id="w1") == (0, 0)
+    assert db.complete_outbox([outbox_id], [], worker_id="w2") == (1, 0)
+
+def test_transient_failure_backs_off(due_posts):
+    db.enqueue_due_reminders(_render)
+    outbox_id, _, _, _, attempts = db.claim_outbox(limit=1, worker_id="w1")[0]
+    assert db.complete_outbox([], [(outbox_id, attempts, "421 try later", False)], worker_id="w1",
+                              retry_base_seconds=60) == (0, 1)
+    state, _, next_attempt_at, claimed_by, last_error = _outbox(outbox_id)
+    assert (state, claimed_by, last_error) == ("pending", None, "421 try later")
+    assert next_attempt_at > datetime.now().timestamp() + 30
+    assert outbox_id not in [row[0] for row in db.claim_outbox(limit=due_posts, worker_id="w1")]
+
+def test_permanent_failure_and_max_attempts_fail_the_row(due_posts):
+    db.enqueue_due_reminders(_render)
+    claimed = db.claim_outbox(limit=2, worker_id="w1")
+    (permanent_id, _, _, _, attempts), (exhausted_id, *_) = claimed
+    db.complete_outbox([], [
+        (permanent_id, attempts, "550 no such user", True),
+        (exhausted_id, 5, "421 try later", False),
+    ], worker_id="w1", max_attempts=5)
+    assert _outbox(permanent_id)[0] == "failed"
+    assert _outbox(exhausted_id)[0] == "failed"
+    assert db.count_outbox_by_state() == {"pending": due_posts - 2, "failed": 2}
+
+def test_claim_fails_rows_out_of_attempts(due_posts):
+    db.enqueue_due_reminders(_render)
+    outbox_id = db.claim_outbox(limit=1, worker_id="w1", lease_seconds=0, max_attempts=1)[0][0]
+    # The lease expired without a result and no attempts are left
+    assert outbox_id not in [row[0] for row in db.claim_outbox(limit=due_posts, worker_id="w2", max_attempts=1)]
+    assert _outbox(outbox_id)[0] == "failed"
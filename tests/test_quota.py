@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pytest
+import db
+import quota
+from conftest import add_user
+
+EMAIL = "alice@example.com"
+
+def _reserve_concurrently(subject: str, role: str, attempts: int) -> int:
+    barrier = threading.Barrier(attempts)
+
+    def attempt(_):
+        barrier.wait()
+        return quota.reserve(subject, role)
+
+    with ThreadPoolExecutor(max_workers=attempts) as pool:
+        return sum(pool.map(attempt, range(attempts)))
+
+def _api_calls(email: str) -> int:
+    with db.transaction() as conn:
+        return conn.execute("SELECT api_calls FROM users WHERE email = ?", (email,)).fetchone()[0]
+
+@pytest.fixture
+def user(database, monkeypatch):
+    # One-day refill so no token comes back while a test runs
+    monkeypatch.setitem(quota.QUOTA_BUCKETS, "user", (3, 86400.0))
+    monkeypatch.setitem(quota.QUOTA_LIMITS, "user", 10)
+    add_user(EMAIL)
+    return EMAIL
+
+def test_concurrent_reservations_never_exceed_bucket(user):
+    assert _reserve_concurrently(user, "user", 20) == 3
+    assert _api_calls(user) == 3
+    assert not quota.reserve(user, "user")
+
+def test_concurrent_reservations_never_exceed_limit(user, monkeypatch):
+    monkeypatch.setitem(quota.QUOTA_BUCKETS, "user", (100, 86400.0))
+    assert _reserve_concurrently(user, "user", 30) == 10
+    assert _api_calls(user) == 10
+
+def test_refund_restores_reservation(user):
+    for _ in range(3):
+        assert quota.reserve(user, "user")
+    assert not quota.reserve(user, "user")
+    quota.refund(user, "user")
+    assert _api_calls(user) == 2
+    assert quota.reserve(user, "user")
+    assert _api_calls(user) == 3
+
+def test_unknown_user_is_denied(database):
+    assert not quota.reserve("nobody@example.com", "user")
+
+def test_concurrent_anonymous_reservations_never_exceed_bucket(monkeypatch):
+    monkeypatch.setitem(quota.QUOTA_BUCKETS, "anonymous", (2, 86400.0))
+    monkeypatch.setattr(quota, "_anonymous", {})
+    assert _reserve_concurrently("session-1", quota.ANONYMOUS_ROLE, 10) == 2
+    quota.refund("session-1", quota.ANONYMOUS_ROLE)
+    assert quota.anonymous_usage("session-1") == 1
@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+import db
+import retention
+from conftest import add_user
+from timeutils import IST
+
+NOW = int(datetime.now(IST).timestamp())
+
+def _schedule(email: str, days_ago: int, content: str):
+    db.schedule_post(email, "twitter", content, datetime.now(IST) - timedelta(days=days_ago), 60)
+
+def _post_ids(email: str = None):
+    with db.transaction() as conn:
+        if email:
+            return {row[0] for row in conn.execute("SELECT id FROM scheduled_posts WHERE user_email = ?", (email,))}
+        return {row[0] for row in conn.execute("SELECT id FROM scheduled_posts")}
+
+@pytest.fixture
+def posts(database):
+    """Old and recent posts for a user (90-day retention) and an admin (kept forever)."""
+    add_user("alice@example.com")
+    add_user("boss@example.com", "admin")
+    _schedule("alice@example.com", 200, "old launch post")
+    _schedule("alice@example.com", 120, "old follow-up post")
+    _schedule("alice@example.com", 10, "recent post")
+    _schedule("boss@example.com", 400, "ancient admin post")
+    return _post_ids()
+
+def _segments(archive_dir):
+    return [os.path.join(archive_dir, name) for name in os.listdir(archive_dir)]
+
+def test_archive_moves_expired_posts_to_a_segment(posts, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    assert retention.archive_expired(NOW, batch_size=1, archive_dir=archive_dir) == 2
+    assert {content for _, _, content, *_ in db.get_user_scheduled_posts.uncached("alice@example.com")} == {"recent post"}
+    assert len(_post_ids("boss@example.com")) == 1
+    (segment,) = _segments(archive_dir)
+    with gzip.open(segment, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert sorted(post["content"] for post in archived) == ["old follow-up post", "old launch post"]
+    assert set(posts) - _post_ids() == {post["id"] for post in archived}
+
+def test_dry_run_only_counts(posts, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    assert retention.archive_expired(NOW, archive_dir=archive_dir, dry_run=True) == 2
+    assert _post_ids() == posts
+    assert not os.path.exists(archive_dir)
+
+def test_restore_by_user_brings_posts_back_held(posts, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    retention.archive_expired(NOW, archive_dir=archive_dir)
+    assert retention.restore(user_email="alice@example.com", archive_dir=archive_dir, hold_days=30) == 2
+    assert _post_ids() == posts
+    with db.transaction() as conn:
+        held = conn.execute("SELECT MIN(retain_until) FROM scheduled_posts WHERE retain_until IS NOT NULL").fetchone()[0]
+    assert held >= NOW + 29 * retention.DAY_SECONDS
+    # Restored posts are indexed again
+    assert len(db.search_scheduled_posts.uncached("launch", "alice@example.com")) == 1
+    # Held posts are not archived a second time, and restoring again adds nothing
+    assert retention.archive_expired(NOW + 60, archive_dir=archive_dir) == 0
+    assert retention.restore(user_email="alice@example.com", archive_dir=archive_dir) == 0
+
+def test_restore_by_ids(posts, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    retention.archive_expired(NOW, archive_dir=archive_dir)
+    archived = sorted(set(posts) - _post_ids())
+    assert retention.restore(post_ids=[archived[0]], archive_dir=archive_dir) == 1
+    assert archived[0] in _post_ids()
+    assert archived[1] not in _post_ids()
+
+def test_damaged_segment_keeps_earlier_batches(posts, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    retention.archive_expired(NOW, batch_size=1, archive_dir=archive_dir)
+    (segment,) = _segments(archive_dir)
+    with open(segment, "ab") as f:
+        f.write(gzip.compress(b'{"id": 999, "user_email": "alice@example.com"')[:-8])
+    assert len(list(retention.iter_archived(archive_dir, "alice@example.com"))) == 2
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+import db
+import search
+from timeutils import IST
+
+def _schedule(email: str, content: str):
+    db.schedule_post(email, "twitter", content, datetime.now(IST) + timedelta(days=1), 60)
+
+def test_user_search_only_sees_own_posts(database):
+    _schedule("al@example.com", "launch day for the new app")
+    # An owner whose email extends another's must not match it
+    _schedule("al@example.com.au", "launch party tonight")
+    results = db.search_scheduled_posts.uncached("launch", "al@example.com")
+    assert [post[1] for post in results] == ["al@example.com"]
+    assert len(db.search_scheduled_posts.uncached("launch")) == 2
+
+def test_user_search_needs_every_term_and_prefixes_the_last(database):
+    _schedule("alice@example.com", "Launching the café menu")
+    _schedule("alice@example.com", "launch recap")
+    _schedule("alice@example.com", "menu update")
+    assert len(db.search_scheduled_posts.uncached("launch", "alice@example.com")) == 2
+    (post,) = db.search_scheduled_posts.uncached("CAFE launchi", "alice@example.com")
+    assert post[3] == "**Launching** the **café** menu"
+    # Longer than the prefix index: FTS5 matches "launch"*, the full prefix is checked after
+    assert db.search_scheduled_posts.uncached("launchpad", "alice@example.com") == []
+
+def test_user_search_ranks_by_relevance(database):
+    _schedule("alice@example.com", "launch " + "filler " * 30)
+    _schedule("alice@example.com", "launch launch news")
+    _schedule("alice@example.com", "weekly news")
+    results = db.search_scheduled_posts.uncached("launch", "alice@example.com")
+    assert [post[3] for post in results][0] == "**launch** **launch** news"
+
+def test_search_input_cannot_inject_fts_syntax(database):
+    _schedule("alice@example.com", "launch OR owner news")
+    assert len(db.search_scheduled_posts.uncached('launch" OR owner:*', "alice@example.com")) == 1
+    assert db.search_scheduled_posts.uncached('"*()', "alice@example.com") == []
+
+def test_snippet_marks_matches_around_the_first_one():
+    content = " ".join(f"word{i}" for i in range(40)) + " launch " + " ".join(f"tail{i}" for i in range(40))
+    snippet = search.snippet(content, ["launch"], size=8)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "**launch**" in snippet and len(snippet.split()) == 8
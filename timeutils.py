@@ -0,0 +1,15 @@
+from datetime import datetime
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+def to_epoch(value) -> int:
+    """
+    Convert a schedule time (datetime or ISO string) to UTC epoch seconds.
+    Naive values are interpreted as IST, the timezone the UI schedules in.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = IST.localize(value)
+    return int(value.timestamp())
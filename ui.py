@@ -1,17 +1,25 @@
-import asyncio
-import sqlite3
+import csv
+import io
+import itertools
+import json
+import math
+import uuid
 import streamlit as st
-import streamlit.components.v1 as components
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
-from db import DB_PATH, verify_user, add_user, get_user_role, get_api_calls, increment_api_calls, schedule_post, get_user_scheduled_posts, delete_scheduled_post, get_all_users, get_all_scheduled_posts
-from api import generate_platform_drafts
-from config import PROMPT_TEMPLATES, TONE_OPTIONS
+from db import verify_user, add_user, get_user_role, get_api_calls, schedule_post, schedule_posts_bulk, get_user_scheduled_posts, delete_scheduled_post, delete_posts_bulk, update_user, delete_user, count_users, get_users_page, count_scheduled_posts, get_scheduled_posts_page, get_post_content, search_scheduled_posts, save_draft_batch, get_draft_batches, get_batch_drafts, save_draft_edit, get_draft_history, delete_draft_batch
+from api import generate_all_drafts, iter_streamed_drafts, all_prompts_cached, run_async
+import generation_cache
+import metrics
+from timeutils import to_epoch
+import quota
+from config import PROMPT_TEMPLATES, TONE_OPTIONS, GEMINI_STREAM_DRAFTS
 import logging
 
 logger = logging.getLogger(__name__)
 IST = pytz.timezone("Asia/Kolkata")
+ADMIN_PAGE_SIZE = 50
+IMPORT_MAX_ERRORS = 20
 
 def login_register():
     logger.info("Rendering login/register UI")
@@ -55,54 +63,33 @@ def login_register():
                 st.error(f"Registration error: {e}")
                 logger.error(f"Registration error for {reg_email}: {e}")
 
-def update_user(email: str, role: str = None, api_calls: int = None):
-    logger.info(f"Updating user: {email}")
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        updates = []
-        params = []
-        if role is not None:
-            updates.append("role = ?")
-            params.append(role)
-        if api_calls is not None:
-            updates.append("api_calls = ?")
-            params.append(api_calls)
-        if updates:
-            params.append(email)
-            query = f"UPDATE users SET {', '.join(updates)} WHERE email = ?"
-            c.execute(query, params)
-            conn.commit()
-            logger.debug(f"User {email} updated successfully")
-        else:
-            logger.debug("No updates provided for user")
-    except sqlite3.Error as e:
-        logger.error(f"Database error updating user: {e}")
-        st.error(f"Database error updating user: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
+def page_cursor(key: str, filters: tuple):
+    """
+    Keyset cursor for the current page of a paginated admin table.
+    The cursor stack in session state is reset whenever the filters change.
+    """
+    state = st.session_state.get(f"{key}_pages")
+    if state is None or state["filters"] != filters:
+        state = st.session_state[f"{key}_pages"] = {"filters": filters, "cursors": [None]}
+    return state["cursors"][-1]
 
-def delete_user(email: str):
-    logger.info(f"Deleting user: {email}")
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM users WHERE email = ?", (email,))
-        c.execute("DELETE FROM scheduled_posts WHERE user_email = ?", (email,))
-        conn.commit()
-        logger.debug(f"User {email} and their scheduled posts deleted successfully")
-    except sqlite3.Error as e:
-        logger.error(f"Database error deleting user: {e}")
-        st.error(f"Database error deleting user: {e}")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            logger.warning("Failed to close database connection")
+def page_controls(key: str, next_cursor, has_next: bool, total: int):
+    # Only called from the admin_panel fragment, so paging reruns just that fragment
+    cursors = st.session_state[f"{key}_pages"]["cursors"]
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun(scope="fragment")
+    with col2:
+        if st.button("Next ▶", key=f"{key}_next", disabled=not has_next):
+            cursors.append(next_cursor)
+            st.rerun(scope="fragment")
+    with col3:
+        st.caption(f"Page {len(cursors)} of {max(1, math.ceil(total / ADMIN_PAGE_SIZE))} ({total} total)")
 
+@st.fragment
+@metrics.timed("ui.admin_panel")
 def admin_panel():
     logger.info("Rendering admin panel")
     st.subheader("Admin Panel")
@@ -119,7 +106,7 @@ def admin_panel():
                 if add_user(new_email.lower(), new_password, new_role):
                     st.success(f"User {new_email} created successfully")
                     logger.info(f"Admin created user: {new_email}")
-                    st.rerun()
+                    st.rerun(scope="fragment")
                 else:
                     st.error("Failed to create user. Email may already exist.")
                     logger.warning(f"Failed to create user: {new_email}")
@@ -129,14 +116,21 @@ def admin_panel():
 
     # Display and manage all users
     st.markdown("### Manage Users")
-    users = get_all_users()
+    total_users = count_users()
+    # One row past the page tells whether a next page exists
+    users = get_users_page(page_cursor("admin_users", ()), ADMIN_PAGE_SIZE + 1)
+    has_next = len(users) > ADMIN_PAGE_SIZE
+    users = users[:ADMIN_PAGE_SIZE]
     if not users:
         st.info("No users found in the database.")
         logger.debug("No users found in database")
+        # A later page can empty out (e.g. its rows were deleted); keep the way back
+        page_controls("admin_users", None, False, total_users)
     else:
         user_data = [{"Email": email, "Role": role, "API Calls": api_calls} for email, role, api_calls in users]
         st.table(user_data)
         logger.debug(f"Displayed {len(user_data)} users in admin panel")
+        page_controls("admin_users", users[-1][0], has_next, total_users)
 
         # Update or delete user
         st.markdown("#### Update/Delete User")
@@ -154,7 +148,7 @@ def admin_panel():
                 update_user(selected_email, role=new_role, api_calls=new_api_calls)
                 st.success(f"User {selected_email} updated successfully")
                 logger.info(f"Admin updated user: {selected_email}")
-                st.rerun()
+                st.rerun(scope="fragment")
             if submit_delete:
                 if selected_email == st.session_state.logged_in_user:
                     st.error("Cannot delete your own admin account!")
@@ -163,37 +157,437 @@ def admin_panel():
                     delete_user(selected_email)
                     st.success(f"User {selected_email} deleted successfully")
                     logger.info(f"Admin deleted user: {selected_email}")
-                    st.rerun()
+                    st.rerun(scope="fragment")
+
+    # Generation cache
+    st.markdown("### Generation Cache")
+    stats = generation_cache.cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hits", stats["hits"])
+    col2.metric("Misses", stats["misses"])
+    col3.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+    col4.metric("Entries", stats.get("entries", 0))
+    if st.button("Clear Generation Cache"):
+        generation_cache.clear()
+        st.success("Generation cache cleared.")
+        logger.info("Admin cleared the generation cache")
+
+    # Latency metrics for this process
+    st.markdown("### Performance Metrics")
+    operations = metrics.snapshot()
+    if not operations:
+        st.info("No operations recorded yet.")
+    else:
+        st.dataframe(operations, hide_index=True, use_container_width=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 Download Prometheus Metrics", metrics.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+    with col2:
+        if st.button("Reset Metrics"):
+            metrics.reset()
+            logger.info("Admin reset performance metrics")
+            st.rerun(scope="fragment")
 
     # Display and manage all scheduled posts
     st.markdown("### All Scheduled Posts")
-    posts = get_all_scheduled_posts()
+    search = st.text_input("🔍 Search post content", key="admin_posts_search").strip()
+    if search:
+        matches = search_scheduled_posts(search, limit=ADMIN_PAGE_SIZE)
+        if not matches:
+            st.info("No scheduled posts match your search.")
+        else:
+            st.table([
+                {
+                    "Post ID": post_id,
+                    "User Email": user_email,
+                    "Platform": platform,
+                    "Match": snippet,
+                    "Scheduled Time (IST)": schedule_time,
+                    "Reminder (min before)": reminder_minutes
+                } for post_id, user_email, platform, snippet, schedule_time, reminder_minutes in matches
+            ])
+            logger.debug(f"Displayed {len(matches)} search results in admin panel")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        platform_filter = st.selectbox("Platform", ["All", *PROMPT_TEMPLATES], key="admin_posts_platform")
+        user_filter = st.text_input("User Email", key="admin_posts_user").strip().lower()
+    with col2:
+        start_date = st.date_input("From (IST)", value=None, key="admin_posts_from")
+        end_date = st.date_input("To (IST, inclusive)", value=None, key="admin_posts_to")
+    with col3:
+        reminder_filter = st.selectbox("Reminder", ["All", "Pending", "Sent"], key="admin_posts_reminder")
+    filters = {
+        "platform": None if platform_filter == "All" else platform_filter,
+        "user_email": user_filter or None,
+        "start_at": to_epoch(datetime.combine(start_date, datetime.min.time())) if start_date else None,
+        "end_at": to_epoch(datetime.combine(end_date + timedelta(days=1), datetime.min.time())) if end_date else None,
+        "reminder_sent": {"All": None, "Pending": False, "Sent": True}[reminder_filter],
+    }
+    total_posts = count_scheduled_posts(**filters)
+    posts = get_scheduled_posts_page(page_cursor("admin_posts", tuple(filters.items())), ADMIN_PAGE_SIZE + 1, **filters)
+    has_next = len(posts) > ADMIN_PAGE_SIZE
+    posts = posts[:ADMIN_PAGE_SIZE]
     if not posts:
         st.info("No scheduled posts found.")
         logger.debug("No scheduled posts found")
+        page_controls("admin_posts", None, False, total_posts)
     else:
         post_data = [
             {
                 "Post ID": post_id,
                 "User Email": user_email,
                 "Platform": platform,
-                "Content": content,
+                "Content": preview,
                 "Scheduled Time (IST)": schedule_time,
-                "Reminder (min before)": reminder_minutes
-            } for post_id, user_email, platform, content, schedule_time, reminder_minutes in posts
+                "Reminder (min before)": reminder_minutes,
+                "Reminder Sent": bool(reminder_sent)
+            } for post_id, user_email, platform, preview, schedule_time, reminder_minutes, reminder_sent, _ in posts
         ]
         st.table(post_data)
         logger.debug(f"Displayed {len(post_data)} scheduled posts in admin panel")
-        
-        # Delete scheduled post
-        st.markdown("#### Delete Scheduled Post")
-        post_id_to_delete = st.number_input("Enter Post ID to delete", min_value=1, step=1)
-        if st.button("Delete Post"):
-            delete_scheduled_post(post_id_to_delete)
-            st.success(f"Scheduled post {post_id_to_delete} deleted.")
-            logger.info(f"Admin deleted scheduled post {post_id_to_delete}")
+        page_controls("admin_posts", (posts[-1][7], posts[-1][0]), has_next, total_posts)
+
+        # Full content is only fetched on request
+        st.markdown("#### Post Details")
+        detail_id = st.selectbox("Post ID", [p[0] for p in posts], key="admin_post_detail")
+        if st.button("Show Full Content"):
+            st.text(get_post_content(detail_id) or "Post not found.")
+
+        # Delete scheduled posts
+        st.markdown("#### Delete Scheduled Posts")
+        ids_to_delete = st.text_input("Post IDs to delete (comma or space separated)", key="admin_posts_delete")
+        if st.button("Delete Posts"):
+            try:
+                post_ids = [int(post_id) for post_id in ids_to_delete.replace(",", " ").split()]
+            except ValueError:
+                st.error("Post IDs must be whole numbers.")
+            else:
+                deleted = delete_posts_bulk(post_ids)
+                st.success(f"Deleted {deleted} of {len(post_ids)} scheduled posts.")
+                logger.info(f"Admin deleted {deleted} scheduled posts")
+                st.rerun(scope="fragment")
+
+def parse_post_import(filename: str, data: bytes):
+    """
+    Parse a CSV or JSONL upload of posts with platform, content, schedule_time and
+    optional reminder_minutes. Times without an offset are taken as IST.
+    Returns (rows, errors) where rows are (platform, content, schedule_time, reminder_minutes).
+    """
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        records = []
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    records.append((line_no, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    records.append((line_no, e))
+    else:
+        records = list(enumerate(csv.DictReader(io.StringIO(text)), 2))
+    now = datetime.now(IST)
+    rows, errors = [], []
+    for line_no, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise ValueError(f"invalid JSON: {record}")
+            platform = str(record.get("platform") or "").strip().lower()
+            if platform not in PROMPT_TEMPLATES:
+                raise ValueError(f"unknown platform {platform!r}")
+            content = str(record.get("content") or "").strip()
+            if not content:
+                raise ValueError("content is empty")
+            schedule_time = datetime.fromisoformat(str(record.get("schedule_time") or "").strip())
+            if schedule_time.tzinfo is None:
+                schedule_time = IST.localize(schedule_time)
+            if schedule_time <= now:
+                raise ValueError("schedule_time must be in the future")
+            reminder = record.get("reminder_minutes")
+            reminder_minutes = int(reminder) if reminder not in (None, "") else 60
+            if not 5 <= reminder_minutes <= 1440:
+                raise ValueError("reminder_minutes must be between 5 and 1440")
+            rows.append((platform, content, schedule_time, reminder_minutes))
+        except (TypeError, ValueError) as e:
+            errors.append(f"Line {line_no}: {e}")
+    return rows, errors
+
+def drafts_csv(drafts: dict) -> str:
+    """One column per platform, one row per draft; built with the csv module to keep pandas off the startup path."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(drafts)
+    writer.writerows(itertools.zip_longest(*drafts.values(), fillvalue=""))
+    return buffer.getvalue()
+
+def load_drafts(drafts: dict, batch_id=None):
+    """Replace the working drafts, dropping the editors' widget state so they show the new text."""
+    for key in [k for k in st.session_state if isinstance(k, str) and k.endswith("_edit")]:
+        del st.session_state[key]
+    st.session_state.drafts = {p: list(d) for p, d in drafts.items()}
+    st.session_state.draft_batch_id = batch_id
+
+def save_generated_drafts(prompt_vars: dict, results: dict):
+    """Show new drafts and, for a logged-in user, keep them so a refresh or logout doesn't cost a regeneration."""
+    batch_id = None
+    if st.session_state.logged_in_user:
+        batch_id = save_draft_batch(st.session_state.logged_in_user, prompt_vars, {p: d for p, d in results.items() if d})
+    load_drafts(results, batch_id)
+
+def persist_draft_edit(platform: str, i: int, content: str):
+    if st.session_state.logged_in_user and st.session_state.draft_batch_id:
+        save_draft_edit(st.session_state.logged_in_user, st.session_state.draft_batch_id, platform, i, content)
+
+def open_draft_batch(email: str):
+    # on_change callback of the previous-generations picker
+    batch_id = st.session_state.draft_batch_select
+    if batch_id is not None:
+        load_drafts(get_batch_drafts(email, batch_id), batch_id)
+        logger.info(f"Reopened draft batch {batch_id} for {email}")
+
+def draft_history_picker(email: str):
+    """Previous generations: only the list is queried; a batch's drafts load when it is opened."""
+    batches = get_draft_batches(email)
+    if not batches:
+        return
+    labels = {
+        batch_id: f"{topic or 'Untitled'} · {datetime.fromtimestamp(created_at, IST).strftime('%d %b %Y %H:%M')}"
+        for batch_id, topic, created_at in batches
+    }
+    current = st.session_state.draft_batch_id
+    options = list(labels) if current in labels else [None, *labels]
+    # format_func can run outside the script run (e.g. AppTest), where session state is unavailable
+    unsaved_label = "Unsaved drafts" if st.session_state.drafts else "—"
+    # Follow generations and restores made since the picker last rendered
+    st.session_state.draft_batch_select = current if current in labels else None
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.selectbox(
+            "🗂️ Previous generations", options, key="draft_batch_select",
+            format_func=lambda b: labels.get(b, unsaved_label),
+            on_change=open_draft_batch, args=(email,)
+        )
+    with col2:
+        if current in labels and st.button("🗑️ Delete generation", key="delete_draft_batch"):
+            delete_draft_batch(email, current)
+            load_drafts({})
+            logger.info(f"Deleted draft batch {current} for {email}")
             st.rerun()
 
+def restore_draft_version(platform: str, i: int, content: str):
+    # on_click callback, so the editor's widget state can still be set before it renders
+    st.session_state[f"{platform}_{i}_edit"] = content
+    st.session_state.drafts[platform][i-1] = content
+    persist_draft_edit(platform, i, content)
+
+def draft_history(platform: str, i: int):
+    versions = get_draft_history(st.session_state.logged_in_user, st.session_state.draft_batch_id, platform, i)
+    if len(versions) <= 1:
+        st.caption("No earlier versions.")
+        return
+    for version, content, created_at in versions[1:]:
+        st.caption(f"Version {version} · {datetime.fromtimestamp(created_at, IST).strftime('%d %b %Y %H:%M')}")
+        st.code(content, language=None, wrap_lines=True)
+        st.button("↩️ Restore", key=f"{platform}_{i}_restore_{version}",
+                  on_click=restore_draft_version, args=(platform, i, content))
+
+def settle_generation_quota(results: dict, from_cache: bool, quota_subject: str, quota_role: str):
+    if from_cache:
+        # Identical request already answered: no Gemini call was made, so nothing was reserved
+        st.caption("⚡ Served from cache; no API call used.")
+        logger.debug("All drafts served from generation cache")
+    elif any(results.values()):
+        quota.commit(quota_subject, quota_role)
+    else:
+        quota.refund(quota_subject, quota_role)
+        logger.debug(f"Refunded generation quota for {quota_subject}: nothing was generated")
+
+def stream_drafts_into_tabs(tabs, prompt_vars: dict, force_fresh: bool, from_cache: bool, quota_subject: str, quota_role: str):
+    """Render each draft into its platform tab as soon as it is complete, then rerun to show the editors."""
+    logger.info("Streaming drafts for all platforms")
+    placeholders = {}
+    for tab, platform in zip(tabs, PROMPT_TEMPLATES):
+        with tab:
+            st.subheader(f"{platform.capitalize()} Drafts")
+            placeholders[platform] = st.container()
+            with placeholders[platform]:
+                st.caption("✍️ Writing drafts…")
+    results = {}
+    try:
+        for event in iter_streamed_drafts(prompt_vars, PROMPT_TEMPLATES, force_fresh):
+            if event[0] == "draft":
+                _, platform, index, draft = event
+                with placeholders[platform]:
+                    st.markdown(f"**Draft {index + 1}:** {draft}")
+            else:
+                _, platform, drafts = event
+                results[platform] = drafts
+    except Exception as e:
+        st.error(f"Generation failed: {e}")
+        logger.error(f"Draft streaming failed: {e}")
+        if not from_cache:
+            quota.refund(quota_subject, quota_role)
+        return
+    save_generated_drafts(prompt_vars, {p: results.get(p, []) for p in PROMPT_TEMPLATES})
+    failed = [p.capitalize() for p in PROMPT_TEMPLATES if not results.get(p)]
+    if failed:
+        st.toast(f"Error generating content from Gemini API for: {', '.join(failed)}", icon="⚠️")
+        logger.warning(f"Draft generation failed for: {failed}")
+    else:
+        st.toast("✅ Drafts generated successfully.")
+    logger.debug("Drafts streamed for all platforms")
+    settle_generation_quota(results, from_cache, quota_subject, quota_role)
+    st.rerun()
+
+@st.fragment
+@metrics.timed("ui.draft_editor")
+def draft_editor(platform: str):
+    """One platform's draft editors. Runs as a fragment, so typing in a draft reruns only this tab."""
+    st.subheader(f"{platform.capitalize()} Drafts")
+    drafts = st.session_state.drafts.get(platform, [])
+    if not drafts:
+        st.info(f"No drafts generated yet for {platform.capitalize()}.")
+        logger.debug(f"No drafts available for {platform}")
+        return
+    for i, draft in enumerate(drafts, 1):
+        st.markdown(f"**Draft {i}:**")
+        draft_key = f"{platform}_{i}_edit"
+        edited_draft = st.text_area(f"Edit Draft {i}", value=draft, key=draft_key, height=100)
+        if edited_draft != draft:
+            st.session_state.drafts[platform][i-1] = edited_draft
+            persist_draft_edit(platform, i, edited_draft)
+            logger.debug(f"Draft {i} edited for {platform}")
+        # st.code has a built-in copy button, so no per-draft iframe is needed
+        st.code(edited_draft, language=None, wrap_lines=True)
+        if st.session_state.draft_batch_id and st.toggle("🕘 History", key=f"{platform}_{i}_history"):
+            draft_history(platform, i)
+        with st.expander(f"📅 Schedule Draft {i}"):
+            schedule_draft(platform, i)
+        st.markdown("---")
+
+@st.fragment
+def drafts_download():
+    """
+    CSV of all drafts, built when the button is pressed. Edits rerun only their own editor fragment,
+    so a file built with the page would miss them; the download button lasts until it is used.
+    """
+    if not st.button("📥 Download All Drafts as CSV", key="drafts_csv_prepare"):
+        return
+    try:
+        st.download_button(
+            label="💾 Save CSV",
+            data=drafts_csv(st.session_state.drafts),
+            file_name="ai_social_media_drafts.csv",
+            mime="text/csv",
+            key="drafts_csv_download"
+        )
+        logger.debug("Download button for drafts CSV rendered")
+    except Exception as e:
+        st.error(f"Error preparing download file: {e}")
+        logger.error(f"Error preparing download file: {e}")
+
+@st.fragment
+def schedule_draft(platform: str, i: int):
+    """Scheduling form for one draft; its date/time widgets rerun only this fragment."""
+    try:
+        col1, col2 = st.columns(2)
+        with col1:
+            schedule_date = st.date_input("📅 Date", key=f"{platform}_{i}_date")
+        with col2:
+            schedule_time_input = st.time_input("⏰ Time (IST)", key=f"{platform}_{i}_clock")
+        # Add reminder minutes input
+        reminder_minutes = st.number_input(
+            "🔔 Reminder (minutes before post)",
+            min_value=5,
+            max_value=1440,  # 1 day max
+            value=60,  # Default to 60 minutes
+            step=5,
+            key=f"{platform}_{i}_reminder"
+        )
+        schedule_time = IST.localize(datetime.combine(schedule_date, schedule_time_input))
+        if st.button(f"Schedule", key=f"{platform}_{i}_btn"):
+            if st.session_state.logged_in_user:
+                if schedule_time < datetime.now(IST):
+                    st.error("Schedule time must be in the future.")
+                    logger.warning(f"Attempt to schedule post in the past: {schedule_time}")
+                else:
+                    schedule_post(
+                        st.session_state.logged_in_user,
+                        platform,
+                        # Fragment arguments are fixed at the last full run; read the latest edit
+                        st.session_state.drafts[platform][i-1],
+                        schedule_time,  # Pass datetime object, converted to IST in schedule_post
+                        reminder_minutes
+                    )
+                    st.success(f"Draft scheduled for {schedule_time.strftime('%Y-%m-%d %H:%M:%S %Z')} with reminder {reminder_minutes} minutes before")
+                    logger.info(f"Draft scheduled for {st.session_state.logged_in_user} on {platform} at {schedule_time} with {reminder_minutes} min reminder")
+                    # Full rerun so the Scheduled Posts tab picks up the new post
+                    st.rerun()
+            else:
+                st.warning("Login required to schedule posts.")
+                logger.warning("Attempt to schedule post without login")
+    except Exception as e:
+        st.error(f"Invalid schedule input: {e}")
+        logger.error(f"Invalid schedule input: {e}")
+
+@st.fragment
+@metrics.timed("ui.scheduled_posts")
+def scheduled_posts_tab(email: str):
+    """The user's scheduled posts, search, import and deletion, rerunning independently of the drafts."""
+    st.subheader("⏰ Your Scheduled Posts")
+    search = st.text_input("🔍 Search your posts", key="user_posts_search").strip()
+    if search:
+        posts = [(post_id, platform, snippet, sched_time, reminder_minutes)
+                 for post_id, _, platform, snippet, sched_time, reminder_minutes
+                 in search_scheduled_posts(search, email)]
+    else:
+        posts = get_user_scheduled_posts(email)
+    with st.expander("📤 Import Posts from CSV/JSONL"):
+        st.caption("Columns: platform, content, schedule_time (IST unless an offset is given, e.g. 2025-01-31 18:30), optional reminder_minutes.")
+        # A file uploader can't be cleared through session_state; a new key gives a fresh, empty one
+        import_round = st.session_state.setdefault("posts_import_round", 0)
+        upload = st.file_uploader("Posts file", type=["csv", "jsonl", "ndjson"], key=f"posts_import_{import_round}")
+        if upload is not None:
+            rows, errors = parse_post_import(upload.name, upload.getvalue())
+            if errors:
+                st.error(f"{len(errors)} invalid rows; fix them and upload again.")
+                st.text("\n".join(errors[:IMPORT_MAX_ERRORS]))
+            elif st.button(f"Schedule {len(rows)} Posts", key="posts_import_btn", disabled=not rows):
+                scheduled = schedule_posts_bulk(
+                    (email, *row) for row in rows
+                )
+                st.toast(f"Scheduled {scheduled} posts.")
+                logger.info(f"{email} imported {scheduled} posts from {upload.name}")
+                if scheduled:
+                    # Drop the imported file so pressing the button again can't schedule it twice
+                    st.session_state.pop(f"posts_import_{import_round}", None)
+                    st.session_state.posts_import_round = import_round + 1
+                st.rerun(scope="fragment")
+    if not posts:
+        st.info("No scheduled posts match your search." if search else "You have no scheduled posts.")
+        logger.debug("No scheduled posts found")
+    else:
+        selected = st.multiselect("Select posts to delete", [post[0] for post in posts], key="user_posts_bulk_delete")
+        if selected and st.button(f"Delete {len(selected)} Selected Posts", key="user_posts_bulk_delete_btn"):
+            deleted = delete_posts_bulk(selected, email)
+            st.success(f"Deleted {deleted} scheduled posts.")
+            logger.info(f"{email} bulk deleted {deleted} scheduled posts")
+            st.rerun(scope="fragment")
+        for post in posts:
+            post_id, platform, content, sched_time, reminder_minutes = post
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**Platform:** {platform.capitalize()}")
+                st.markdown(f"**Scheduled Time (IST):** {sched_time}")
+                st.markdown(f"**Reminder:** {reminder_minutes} minutes before")
+                st.markdown(f"**Content:** {content}")
+            with col2:
+                if st.button(f"Delete Post ID {post_id}", key=f"del_{post_id}"):
+                    delete_scheduled_post(post_id)
+                    st.success("Scheduled post deleted.")
+                    logger.info(f"Scheduled post {post_id} deleted by {email}")
+                    st.rerun(scope="fragment")
+            st.markdown("---")
+
+@metrics.timed("ui.render_main_ui")
 def render_main_ui():
     logger.info("Rendering main UI")
     st.title("✨ Pose Muse ")
@@ -205,15 +599,18 @@ def render_main_ui():
         st.session_state.logged_in_user = None
     if "drafts" not in st.session_state:
         st.session_state.drafts = {}
-    if "api_call_count" not in st.session_state:
-        st.session_state.api_call_count = 0
+    if "draft_batch_id" not in st.session_state:
+        st.session_state.draft_batch_id = None
+    if "quota_session_id" not in st.session_state:
+        st.session_state.quota_session_id = uuid.uuid4().hex
 
     # User status and API limits
     if st.session_state.logged_in_user is None:
         login_register()
-        st.info("Use the app as a free user without login (max 5 calls per session).")
-        limit = 5
-        usage = st.session_state.api_call_count
+        quota_subject, quota_role = st.session_state.quota_session_id, quota.ANONYMOUS_ROLE
+        limit = quota.limit_for(quota_role)
+        st.info(f"Use the app as a free user without login (max {limit} calls per session).")
+        usage = quota.anonymous_usage(quota_subject)
         st.markdown(f"**API calls used:** {usage} / {limit}")
         logger.debug(f"Free user API usage: {usage}/{limit}")
         if usage >= limit:
@@ -224,20 +621,29 @@ def render_main_ui():
         email = st.session_state.logged_in_user
         role = get_user_role(email)
         usage = get_api_calls(email)
-        limit = float("inf") if role == "admin" else 10
+        quota_subject, quota_role = email, role
+        limit = quota.limit_for(role)
         col1, col2 = st.columns([3, 1])
         with col1:
             st.info(f"Logged in as {email} ({role})")
-            st.markdown(f"**API calls used:** {usage} / {limit if limit != float('inf') else '∞'}")
+            st.markdown(f"**API calls used:** {usage} / {limit if limit is not None else '∞'}")
             logger.debug(f"Logged-in user {email} API usage: {usage}/{limit}")
         with col2:
             if st.button("Logout"):
                 logger.info(f"User {email} logged out")
                 st.session_state.logged_in_user = None
-                st.session_state.drafts = {}
+                st.session_state.drafts_restored = False
+                load_drafts({})
                 st.rerun()
 
-        if limit != float("inf") and usage >= limit:
+        if not st.session_state.get("drafts_restored"):
+            # Reopen the latest generation after a login instead of starting empty
+            st.session_state.drafts_restored = True
+            batches = get_draft_batches(email, 1)
+            if batches and not st.session_state.drafts:
+                load_drafts(get_batch_drafts(email, batches[0][0]), batches[0][0])
+
+        if limit is not None and usage >= limit:
             st.error("⚠️ API call limit reached. Contact admin for more access.")
             logger.warning(f"API call limit reached for user: {email}")
             st.stop()
@@ -260,136 +666,67 @@ def render_main_ui():
         st.warning("Please enter a topic to enable generation.")
         logger.warning("Topic input is empty")
     
+    col1, col2 = st.columns(2)
+    with col1:
+        force_fresh = st.checkbox("🔄 Force fresh generation (skip cache)", key="force_fresh")
+    with col2:
+        stream_drafts = st.checkbox(
+            "⚡ Stream drafts as they are written", value=GEMINI_STREAM_DRAFTS, key="stream_drafts",
+            help="Shows drafts sooner, but uses one request per platform instead of a single combined request."
+        )
+    stream_request = None
     if st.button("🚀 Generate All Drafts") and topic.strip():
         logger.info("Generating drafts for all platforms")
-        with st.spinner("Generating all drafts…"):
-            try:
-                tasks = [generate_platform_drafts(p, {
-                    "topic": topic,
-                    "hashtags": hashtags,
-                    "insight": insight,
-                    "tone": tone
-                }, PROMPT_TEMPLATES) for p in PROMPT_TEMPLATES]
-                results = asyncio.run(asyncio.gather(*tasks))
-                for p, d in zip(PROMPT_TEMPLATES, results):
-                    st.session_state.drafts[p] = d
-                st.info("✅ Drafts generated successfully. Scroll down to review them.")
-                logger.debug("Drafts generated successfully for all platforms")
-                if st.session_state.logged_in_user is None:
-                    st.session_state.api_call_count += 1
-                    logger.debug(f"Incremented free user API call count: {st.session_state.api_call_count}")
-                else:
-                    increment_api_calls(st.session_state.logged_in_user)
-                    logger.debug(f"Incremented API calls for user: {st.session_state.logged_in_user}")
-            except Exception as e:
-                st.error(f"Generation failed: {e}")
-                logger.error(f"Draft generation failed: {e}")
+        prompt_vars = {
+            "topic": topic,
+            "hashtags": hashtags,
+            "insight": insight,
+            "tone": tone
+        }
+        from_cache = not force_fresh and all_prompts_cached(prompt_vars, PROMPT_TEMPLATES, stream_drafts)
+        if not from_cache and not quota.reserve(quota_subject, quota_role):
+            # Usually the token bucket; another tab may also have used the last call
+            st.error("⏳ Generation quota unavailable: you're generating too quickly or have hit your limit. Please wait a few seconds and try again.")
+            logger.warning(f"Generation rate limited for {quota_subject}")
+        elif stream_drafts:
+            # Drafts are streamed into the tabs below, once their placeholders exist
+            stream_request = (prompt_vars, force_fresh, from_cache, quota_subject, quota_role)
+        else:
+            with st.spinner("Generating all drafts…"), metrics.timer("ui.generate"):
+                results = {}
+                try:
+                    results = run_async(generate_all_drafts(prompt_vars, PROMPT_TEMPLATES, force_fresh))
+                    save_generated_drafts(prompt_vars, results)
+                    failed = [p.capitalize() for p, d in results.items() if not d]
+                    if failed:
+                        st.error(f"Error generating content from Gemini API for: {', '.join(failed)}")
+                        logger.warning(f"Draft generation failed for: {failed}")
+                    st.info("✅ Drafts generated successfully. Scroll down to review them.")
+                    logger.debug("Drafts generated successfully for all platforms")
+                except Exception as e:
+                    st.error(f"Generation failed: {e}")
+                    logger.error(f"Draft generation failed: {e}")
+                settle_generation_quota(results, from_cache, quota_subject, quota_role)
 
     st.markdown("---")
 
+    if st.session_state.logged_in_user:
+        draft_history_picker(st.session_state.logged_in_user)
+
     # Tabs for drafts and scheduled posts
     tabs = st.tabs(["🐦 Twitter", "💼 LinkedIn", "📸 Instagram", "⏰ Scheduled Posts"] if st.session_state.logged_in_user else ["🐦 Twitter", "💼 LinkedIn", "📸 Instagram"])
     
+    if stream_request:
+        with metrics.timer("ui.stream_drafts"):
+            stream_drafts_into_tabs(tabs[:3], *stream_request)
+
     for tab, platform in zip(tabs[:3], PROMPT_TEMPLATES):
         with tab:
-            st.subheader(f"{platform.capitalize()} Drafts")
-            drafts = st.session_state.drafts.get(platform, [])
-            if not drafts:
-                st.info(f"No drafts generated yet for {platform.capitalize()}.")
-                logger.debug(f"No drafts available for {platform}")
-            else:
-                for i, draft in enumerate(drafts, 1):
-                    st.markdown(f"**Draft {i}:**")
-                    draft_key = f"{platform}_{i}_edit"
-                    edited_draft = st.text_area(f"Edit Draft {i}", value=draft, key=draft_key, height=100)
-                    if edited_draft != draft:
-                        st.session_state.drafts[platform][i-1] = edited_draft
-                        logger.debug(f"Draft {i} edited for {platform}")
-                    col1, col2 = st.columns([0.85, 0.15])
-                    with col1:
-                        st.markdown(f"**Content:** {edited_draft}")
-                    with col2:
-                        components.html(f"""
-                            <button onclick="navigator.clipboard.writeText(`{edited_draft.replace('`', '\\`')}`);alert('Copied!');">
-                                Copy
-                            </button>
-                        """, height=35)
-                    with st.expander(f"📅 Schedule Draft {i}"):
-                        try:
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                schedule_date = st.date_input("📅 Date", key=f"{platform}_{i}_date")
-                            with col2:
-                                schedule_time_input = st.time_input("⏰ Time (IST)", key=f"{platform}_{i}_clock")
-                            # Add reminder minutes input
-                            reminder_minutes = st.number_input(
-                                "🔔 Reminder (minutes before post)",
-                                min_value=5,
-                                max_value=1440,  # 1 day max
-                                value=60,  # Default to 60 minutes
-                                step=5,
-                                key=f"{platform}_{i}_reminder"
-                            )
-                            schedule_time = datetime.combine(schedule_date, schedule_time_input).replace(tzinfo=IST)
-                            if st.button(f"Schedule", key=f"{platform}_{i}_btn"):
-                                if st.session_state.logged_in_user:
-                                    if schedule_time < datetime.now(IST):
-                                        st.error("Schedule time must be in the future.")
-                                        logger.warning(f"Attempt to schedule post in the past: {schedule_time}")
-                                    else:
-                                        schedule_post(
-                                            st.session_state.logged_in_user,
-                                            platform,
-                                            edited_draft,
-                                            schedule_time,  # Pass datetime object, converted to IST in schedule_post
-                                            reminder_minutes
-                                        )
-                                        st.success(f"Draft scheduled for {schedule_time.strftime('%Y-%m-%d %H:%M:%S %Z')} with reminder {reminder_minutes} minutes before")
-                                        logger.info(f"Draft scheduled for {st.session_state.logged_in_user} on {platform} at {schedule_time} with {reminder_minutes} min reminder")
-                                        st.rerun()
-                                else:
-                                    st.warning("Login required to schedule posts.")
-                                    logger.warning("Attempt to schedule post without login")
-                        except Exception as e:
-                            st.error(f"Invalid schedule input: {e}")
-                            logger.error(f"Invalid schedule input: {e}")
-                    st.markdown("---")
+            draft_editor(platform)
 
     if st.session_state.logged_in_user:
         with tabs[3]:
-            st.subheader("⏰ Your Scheduled Posts")
-            posts = get_user_scheduled_posts(st.session_state.logged_in_user)
-            if not posts:
-                st.info("You have no scheduled posts.")
-                logger.debug("No scheduled posts found")
-            else:
-                for post in posts:
-                    post_id, platform, content, sched_time, reminder_minutes = post
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.markdown(f"**Platform:** {platform.capitalize()}")
-                        st.markdown(f"**Scheduled Time (IST):** {sched_time}")
-                        st.markdown(f"**Reminder:** {reminder_minutes} minutes before")
-                        st.markdown(f"**Content:** {content}")
-                    with col2:
-                        if st.button(f"Delete Post ID {post_id}", key=f"del_{post_id}"):
-                            delete_scheduled_post(post_id)
-                            st.success("Scheduled post deleted.")
-                            logger.info(f"Scheduled post {post_id} deleted by {st.session_state.logged_in_user}")
-                            st.rerun()
-                    st.markdown("---")
+            scheduled_posts_tab(st.session_state.logged_in_user)
 
     if st.session_state.drafts:
-        try:
-            df = pd.DataFrame({p: v for p, v in st.session_state.drafts.items()})
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download All Drafts as CSV",
-                data=csv,
-                file_name="ai_social_media_drafts.csv",
-                mime="text/csv"
-            )
-            logger.debug("Download button for drafts CSV rendered")
-        except Exception as e:
-            st.error(f"Error preparing download file: {e}")
-            logger.error(f"Error preparing download file: {e}")
\ No newline at end of file
+        drafts_download()
\ No newline at end of file